@@ -0,0 +1,245 @@
+import hmac
+import json
+import time
+from itertools import islice
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy.orm import raiseload
+
+from export import EXPORT_FORMATS, EXPORTS, encode, export_rows
+from extensions import goal_catalog, slot_events
+from models import db, teachers_goals_association, Teacher
+from pages import free_search_args
+from queries import SORT_MODES, free_teachers
+from schedule import from_mask
+from search import search_teachers
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+TEACHER_FIELDS = ('id', 'name', 'about', 'rating', 'picture', 'price', 'goals')
+API_SORT_MODES = {'rating': '2', 'price_desc': '3', 'price_asc': '4'}
+CHUNK_SIZE = 200
+
+
+def api_error(message, status):
+    response = jsonify(error=message)
+    response.status_code = status
+    return response
+
+
+def parse_fields():
+    """ requested teacher fields from ?fields=id,name,... or all of them """
+
+    fields = request.args.get('fields')
+    if not fields:
+        return TEACHER_FIELDS
+    fields = tuple(field.strip() for field in fields.split(','))
+    unknown = [field for field in fields if field not in TEACHER_FIELDS]
+    if unknown:
+        return None
+    return fields
+
+
+def goal_names(teacher_ids):
+    """ {teacher_id: [goal names]} for given teachers by one query """
+
+    names = {goal.id: goal.name for goal in goal_catalog.all()}
+    result = {teacher_id: [] for teacher_id in teacher_ids}
+    rows = db.session.query(teachers_goals_association.c.teacher_id, teachers_goals_association.c.goal_id) \
+        .filter(teachers_goals_association.c.teacher_id.in_(teacher_ids))
+    for teacher_id, goal_id in rows:
+        result[teacher_id].append(names.get(goal_id))
+    return result
+
+
+def teacher_to_dict(teacher, fields, goals):
+    data = {field: getattr(teacher, field) for field in fields if field != 'goals'}
+    if 'goals' in fields:
+        data['goals'] = goals
+    return data
+
+
+def teachers_query(sort, goal_id):
+    """ teachers in order of sort mode, filtered by goal when goal_id is given,
+        random mode returns two queries to be walked one after another """
+
+    teachers = db.session.query(Teacher).options(raiseload('*'))
+    if goal_id is not None:
+        teachers = teachers \
+            .join(teachers_goals_association, teachers_goals_association.c.teacher_id == Teacher.id) \
+            .filter(teachers_goals_association.c.goal_id == goal_id)
+    if sort == 'random':
+        seed = request.args.get('seed', type=int, default=0)
+        teachers = teachers.order_by(Teacher.random_key, Teacher.id)
+        return [teachers.filter(Teacher.random_key >= seed), teachers.filter(Teacher.random_key < seed)]
+    if sort in API_SORT_MODES:
+        key, descending, _ = SORT_MODES[API_SORT_MODES[sort]]
+        return [teachers.order_by(key.desc(), Teacher.id.desc()) if descending else teachers.order_by(key, Teacher.id)]
+    return [teachers.order_by(Teacher.id)]
+
+
+def stream_teachers(queries, fields):
+    """ json array of teachers generated chunk by chunk, only one chunk is held in memory """
+
+    yield '['
+    first = True
+    for query in queries:
+        rows = iter(query.yield_per(CHUNK_SIZE))
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            goals = goal_names([teacher.id for teacher in chunk]) if 'goals' in fields else {}
+            items = (json.dumps(teacher_to_dict(teacher, fields, goals.get(teacher.id)), ensure_ascii=False)
+                     for teacher in chunk)
+            yield ('' if first else ',') + ','.join(items)
+            first = False
+    yield ']'
+
+
+@api.route('/goals/')
+def list_goals():
+    return jsonify([{'name': goal.name, 'value': goal.value} for goal in goal_catalog.all()])
+
+
+@api.route('/teachers/')
+def list_teachers():
+    """ ?sort=rating|price_desc|price_asc|random&seed=&goal=&fields=id,name,... """
+
+    sort = request.args.get('sort')
+    if sort is not None and sort != 'random' and sort not in API_SORT_MODES:
+        return api_error('unknown sort mode', 400)
+    fields = parse_fields()
+    if fields is None:
+        return api_error('unknown field, allowed: {}'.format(','.join(TEACHER_FIELDS)), 400)
+    goal_id = None
+    if request.args.get('goal'):
+        goal = goal_catalog.get(request.args['goal'])
+        if goal is None:
+            return api_error('unknown goal', 404)
+        goal_id = goal.id
+    queries = teachers_query(sort, goal_id)
+    return Response(stream_with_context(stream_teachers(queries, fields)),
+                    mimetype='application/json')
+
+
+@api.route('/teachers/<int:teacher_id>/')
+def get_teacher(teacher_id):
+    fields = parse_fields()
+    if fields is None:
+        return api_error('unknown field, allowed: {}'.format(','.join(TEACHER_FIELDS)), 400)
+    teacher = db.session.query(Teacher).options(raiseload('*')).get(teacher_id)
+    if teacher is None:
+        return api_error('teacher not found', 404)
+    goals = goal_names([teacher_id]) if 'goals' in fields else {}
+    data = teacher_to_dict(teacher, fields, goals.get(teacher_id))
+    data['schedule'] = from_mask(teacher.free_mask)
+    return jsonify(data)
+
+
+@api.route('/teachers/<int:teacher_id>/schedule/')
+def get_schedule(teacher_id):
+    """ {day: {time: is_free}} """
+
+    row = db.session.query(Teacher.free_mask).filter(Teacher.id == teacher_id).first()
+    if row is None:
+        return api_error('teacher not found', 404)
+    return jsonify(from_mask(row.free_mask))
+
+
+def slot_stream(subscription, schedule, seconds, keepalive):
+    """ server-sent events: whole schedule first, then every slot change of the teacher, the stream ends
+        after seconds, before gunicorn worker timeout, and EventSource reconnects to fresh schedule """
+
+    yield 'retry: 1000\nevent: schedule\ndata: {}\n\n'.format(json.dumps(schedule))
+    deadline = time.monotonic() + seconds
+    remaining = seconds
+    while remaining > 0:
+        event = subscription.get(min(keepalive, remaining))
+        yield ': keepalive\n\n' if event is None else 'event: slot\ndata: {}\n\n'.format(json.dumps(event))
+        remaining = deadline - time.monotonic()
+
+
+@api.route('/teachers/<int:teacher_id>/schedule/stream/')
+def stream_schedule(teacher_id):
+    """ text/event-stream of slot changes of teacher, subscribed before schedule is read,
+        so a change committed in between is pushed too, db connection isn't held while streaming,
+        204 without SLOT_STREAM tells EventSource not to reconnect """
+
+    if not current_app.config['SLOT_STREAM']:
+        return '', 204
+    subscription = slot_events.subscribe(teacher_id)
+    row = db.session.query(Teacher.free_mask).filter(Teacher.id == teacher_id).first()
+    if row is None:
+        subscription.close()
+        return api_error('teacher not found', 404)
+    stream = slot_stream(subscription, from_mask(row.free_mask),
+                         current_app.config['SLOT_STREAM_SECONDS'], current_app.config['SLOT_STREAM_KEEPALIVE'])
+    response = Response(stream, mimetype='text/event-stream')
+    # runs when the server closes the response, also when client went away or stream never started
+    response.call_on_close(subscription.close)
+    response.cache_control.no_store = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api.route('/search/')
+def search():
+    """ ?q=words&goal=&sort=rank|rating|price_desc|price_asc, snippet has <mark> around matches """
+
+    sort = request.args.get('sort', 'rank')
+    if sort != 'rank' and sort not in API_SORT_MODES:
+        return api_error('unknown sort mode', 400)
+    goal_id = None
+    if request.args.get('goal'):
+        goal = goal_catalog.get(request.args['goal'])
+        if goal is None:
+            return api_error('unknown goal', 404)
+        goal_id = goal.id
+    results = search_teachers(db.session, request.args.get('q', ''),
+                              goal_id=goal_id,
+                              selected=API_SORT_MODES.get(sort),
+                              limit=current_app.config['SEARCH_LIMIT'])
+    return jsonify([dict(result, snippet=str(result['snippet'])) for result in results])
+
+
+@api.route('/free/')
+def free():
+    """ ?day=wed&from=18&to=20&goal=&min_price=&max_price=, teachers free at that time with free times """
+
+    search_args = free_search_args()
+    if search_args is None:
+        return api_error('day is required, one of mon..sun', 400)
+    results = free_teachers(limit=current_app.config['SEARCH_LIMIT'], **search_args)
+    return jsonify([{'id': teacher.id, 'name': teacher.name, 'rating': teacher.rating,
+                     'price': teacher.price, 'picture': teacher.picture, 'free_times': free_times}
+                    for teacher, free_times in results])
+
+
+def export_authorized():
+    """ Authorization: Bearer <EXPORT_TOKEN> header, compared in constant time """
+
+    expected = 'Bearer {}'.format(current_app.config['EXPORT_TOKEN'])
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode())
+
+
+@api.route('/export/<table>.<export_format>')
+def export(table, export_format):
+    """ bookings or requests as csv or ndjson streamed in id order, ?after_id= continues from the
+        last id of previous export, disabled until EXPORT_TOKEN is set """
+
+    if not current_app.config.get('EXPORT_TOKEN'):
+        return api_error('export is disabled', 404)
+    if not export_authorized():
+        response = api_error('export token required', 401)
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response
+    if table not in EXPORTS or export_format not in EXPORT_FORMATS:
+        return api_error('unknown export, allowed: {}.{{{}}}'.format('|'.join(EXPORTS), ','.join(EXPORT_FORMATS)), 404)
+    columns, rows = export_rows(table, request.args.get('after_id', type=int))
+    response = Response(stream_with_context(encode(columns, rows, export_format)),
+                        mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(table, export_format)
+    response.cache_control.no_store = True
+    return response
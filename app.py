@@ -1,222 +1,91 @@
-import json
-import random
+import os
 
-from flask import Flask, render_template, abort, request
-from flask_sqlalchemy import SQLAlchemy
-from flask_wtf import FlaskForm
-from flask_migrate import Migrate
-from wtforms import StringField, SubmitField
-from wtforms.validators import InputRequired, Length
+from flask import Flask
 
-from data import days
+from api import api
+from assets import assets, init_assets
+from commands import init_commands
+from compression import init_compression
+from extensions import facet_summary, goal_catalog, goal_index, init_extensions
+from metrics import init_metrics
+from models import db
+from pages import pages, render_samples
+from sqlite_profile import SQLITE_PRAGMAS, engine_options, init_sqlite
+from template_cache import compile_templates, init_template_cache
 
 
-app = Flask(__name__)
 SECRET_KEY = "my_super_secret_key"
-app.config['SECRET_KEY'] = SECRET_KEY
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data/data_base.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
 
 
-teachers_goals_association = db.Table("teachers_goals",
-                                      db.Column("teacher_id", db.Integer, db.ForeignKey("teachers.id")),
-                                      db.Column("goal_id", db.Integer, db.ForeignKey("goals.id"))
-                                      )
-
-
-class Teacher(db.Model):
-    __tablename__ = "teachers"
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(), nullable=False)
-    about = db.Column(db.Text, nullable=False)
-    rating = db.Column(db.Float, nullable=False)
-    picture = db.Column(db.String(), nullable=False)
-    price = db.Column(db.Integer, nullable=False)
-    goals = db.relationship("Goal", secondary=teachers_goals_association, back_populates="teachers")
-    free = db.Column(db.String(), nullable=False)
-
-    bookings = db.relationship("Booking", back_populates="teacher")
-
-
-class Booking(db.Model):
-    __tablename__ = "bookings"
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(), nullable=False)
-    phone = db.Column(db.String(), nullable=False)
-    weekday = db.Column(db.String(), nullable=False)
-    time = db.Column(db.String(), nullable=False)
-
-    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"))
-    teacher = db.relationship("Teacher", back_populates="bookings")
-
-
-class Goal(db.Model):
-    __tablename__ = "goals"
-
-    id = db.Column(db.Integer, primary_key=True,)
-    name = db.Column(db.String(), unique=True, nullable=False)
-    value = db.Column(db.String(), nullable=False)
-    teachers = db.relationship("Teacher", secondary=teachers_goals_association, back_populates="goals")
-    requests = db.relationship("Request", back_populates="goal")
-
-
-class Request(db.Model):
-    __tablename__ = "requests"
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(), nullable=False)
-    phone = db.Column(db.String(), nullable=False)
-    time = db.Column(db.String(), nullable=False)
-    goal_id = db.Column(db.Integer, db.ForeignKey("goals.id"))
-    goal = db.relationship("Goal", back_populates="requests")
-
-
-class RequestForm(FlaskForm):
-    name = StringField("Вас зовут",
-                       [InputRequired(message="Необходимо указать имя")])
-    phone = StringField("Ваш телефон",
-                        [InputRequired(message="Необходимо указать телефон"),
-                         Length(min=7, max=15, message="Номер должен быть от 7 до 15-ти цифр")])
-    submit = SubmitField('Найдите мне преподавателя')
-
-
-class BookingForm(FlaskForm):
-    name = StringField("Вас зовут",
-                       validators=[InputRequired(message="Необходимо указать имя")])
-    phone = StringField("Ваш телефон",
-                        validators=[InputRequired(message="Необходимо указать телефон"),
-                                    Length(min=7, max=15, message="Номер должен быть от 7 до 15-ти цифр")])
-    submit = SubmitField('Записаться на пробный урок')
-
-
-@app.errorhandler(404)
-def render_not_found(error):
-    """ 404 error custom handler """
-
-    return 'Ничего не нашлось! Вот неудача, отправляйтесь на главную!\n<a href="/">TINYSTEPS</a>'
-
-
-# done
-@app.route('/')
-def render_index():
-    """ prepare data and render route '/' """
-
-    teachers = db.session.query(Teacher).order_by(db.func.random()).limit(6).all()
-    goals = db.session.query(Goal).all()
-    return render_template('index.html',
-                           teachers=teachers,
-                           goals=goals)
-
-
-@app.route('/all/', methods=['POST', 'GET'])
-def render_all():
-    """ prepare data and render route '/all/' """
-
-    teachers = db.session.query(Teacher)
-    selected_value = request.args.get('selected')
-    if selected_value == '2':
-        teachers = teachers.order_by(Teacher.rating.desc()).all()
-    elif selected_value == '3':
-        teachers = teachers.order_by(Teacher.price.desc()).all()
-    elif selected_value == '4':
-        teachers = teachers.order_by(Teacher.price).all()
-    else:
-        teachers = teachers.all()
-        random.shuffle(teachers)
-    return render_template('all.html',
-                           teachers=teachers)
-
-
-# done
-@app.route('/goals/<goal>/')
-def render_goal(goal):
-    """ prepare data and render route for goal """
-
-    teachers = db.session.query(Teacher).filter(Teacher.goals.any(Goal.name == goal)).order_by(Teacher.rating.desc())
-    teachers = teachers.all()
-    goal = db.session.query(Goal).filter(Goal.name == goal).first().value
-    return render_template('goal.html',
-                           goal=goal,
-                           teachers=teachers)
-
-
-# done
-@app.route('/profiles/<int:teacher_id>/')
-def render_teacher(teacher_id):
-    """ prepare data and render route for teacher profile """
-
-    teacher = db.session.query(Teacher).get_or_404(teacher_id)
-    free = json.loads(teacher.free)
-    return render_template('profile.html',
-                           teacher=teacher,
-                           free=free,
-                           days=days)
-
-
-# done
-@app.route('/request/', methods=['GET', 'POST'])
-def route_request():
-    """ prepare data and render request route for both methods"""
-
-    goals = db.session.query(Goal)
-    first_goal = goals.first().name
-    form = RequestForm()
-    if request.method == "POST":
-        if form.validate_on_submit():
-            goal = request.form.get("goal")
-            time = request.form.get("time")
-            name = form.name.data
-            phone = form.phone.data
-            goal = db.session.query(Goal).filter(Goal.name == goal).first()
-            req = Request(name=name, phone=phone, time=time, goal=goal)
-            db.session.add(req)
-            db.session.commit()
-            return render_template('request_done.html',
-                                   req=req)
-    return render_template('request.html',
-                           goals=goals.all(),
-                           first_goal=first_goal,
-                           form=form)
-
-
-@app.route('/booking/<int:teacher_id>/<day>/<time>/', methods=['GET', 'POST'])
-def route_booking(teacher_id, day, time):
-    """ prepare data and render booking route for both methods"""
-
-    form = BookingForm()
-    time = time + ':00'
-    teacher = db.session.query(Teacher).get_or_404(teacher_id)
-    if day not in days:
-        abort(404)
-    if request.method == "POST":
-        if form.validate_on_submit():
-            name = form.name.data
-            phone = form.phone.data
-            free = json.loads(teacher.free)
-            free[day][time] = False
-            teacher.free = json.dumps(free)
-            booking = Booking(name=name,
-                              phone=phone,
-                              weekday=day,
-                              time=time,
-                              teacher=teacher)
-            db.session.add(booking)
-            db.session.commit()
-            day = days[day]
-            return render_template('booking_done.html',
-                                   day=day,
-                                   booking=booking)
-    return render_template('booking.html',
-                           form=form,
-                           teacher=teacher,
-                           days=days,
-                           day=day,
-                           time=time)
+def create_app(config=None):
+    """ build app with default settings updated from config mapping,
+        nothing touches the database until the first request or command """
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = SECRET_KEY
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///data/data_base.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(os.environ.get('WORKER_CLASS', 'sync'),
+                                                             int(os.environ.get('WORKER_THREADS', 1)),
+                                                             os.environ.get('REQUEST_WRITE_BEHIND') == '1')
+    app.config['SQLITE_PRAGMAS'] = SQLITE_PRAGMAS
+    app.config['SQLITE_BEGIN_IMMEDIATE'] = True
+    app.config['REQUEST_WRITE_BEHIND'] = os.environ.get('REQUEST_WRITE_BEHIND') == '1'
+    app.config['REQUEST_QUEUE_PATH'] = os.environ.get('REQUEST_QUEUE_PATH', 'data/request_queue.db')
+    app.config['REQUEST_BATCH_SIZE'] = 100
+    app.config['REQUEST_MAX_LATENCY'] = 1.0
+    app.config['SLOT_EVENTS_PATH'] = os.environ.get('SLOT_EVENTS_PATH', 'data/slot_events.db')
+    app.config['SLOT_EVENTS_POLL_INTERVAL'] = 0.5
+    # an open stream holds its worker connection, only gevent workers can keep many of them
+    app.config['SLOT_STREAM'] = os.environ.get('WORKER_CLASS') == 'gevent'
+    app.config['SLOT_STREAM_SECONDS'] = 25
+    app.config['SLOT_STREAM_KEEPALIVE'] = 10
+    app.config['SEARCH_LIMIT'] = 50
+    app.config['TEACHERS_PER_PAGE'] = 20
+    app.config['GOAL_CATALOG_VERSION_FILE'] = os.environ.get('GOAL_CATALOG_VERSION_FILE', 'data/goals.version')
+    app.config['FACET_SUMMARY_VERSION_FILE'] = os.environ.get('FACET_SUMMARY_VERSION_FILE', 'data/facets.version')
+    app.config['GOAL_INDEX_VERSION_FILE'] = os.environ.get('GOAL_INDEX_VERSION_FILE', 'data/goal_index.version')
+    app.config['RANDOM_KEYS_VERSION_FILE'] = os.environ.get('RANDOM_KEYS_VERSION_FILE', 'data/random_keys.version')
+    app.config['TEACHER_CARD_CACHE_BYTES'] = 4 * 1024 * 1024
+    app.config['MIGRATIONS'] = True
+    app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', 'data/template_cache')
+    app.config['ASSETS_DIR'] = os.environ.get('ASSETS_DIR', 'data/assets')
+    app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600
+    app.config['COMPRESS_MIMETYPES'] = ('text/html', 'application/json')
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['EXPORT_TOKEN'] = os.environ.get('EXPORT_TOKEN')
+    app.config.update(config or {})
+
+    init_template_cache(app)
+    init_extensions(app)
+    init_metrics(app)
+    init_assets(app)
+    init_compression(app)
+    init_sqlite(app)
+    init_commands(app)
+
+    app.register_blueprint(pages)
+    app.register_blueprint(api)
+    app.register_blueprint(assets)
+    return app
+
+
+def warm_up(app):
+    """ load what every request needs before workers are forked (gunicorn --preload) or before
+        worker takes traffic: goal catalog, facet summary, goal index, every template compiled and rendered once,
+        forked workers share it copy-on-write, db connections are closed so each worker opens its own """
+
+    with app.app_context():
+        goal_catalog.refresh()
+        facet_summary.refresh()
+        goal_index.refresh()
+        compile_templates(app)
+        with app.test_request_context():
+            render_samples()
+        db.session.remove()
+        db.engine.dispose()
 
 
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from functools import lru_cache
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+
+MANIFEST = "manifest.json"
+
+# compressed copy is kept only when it saves at least this share, png and jpeg are compressed already
+MIN_SAVING = 0.1
+
+IMMUTABLE = "public, max-age={}, immutable"
+
+
+assets = Blueprint('assets', __name__)
+
+
+@lru_cache(maxsize=None)
+def brotli_module():
+    """ brotli module or None, it is optional and only makes .br copies """
+
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def hashed_name(name, content):
+    """ 'pict 1.png' -> 'pict-1.<first 12 hex digits of sha256>.png', spaces don't survive urls well """
+
+    stem, extension = os.path.splitext(name)
+    return "{}.{}{}".format(stem.replace(" ", "-"), hashlib.sha256(content).hexdigest()[:12], extension)
+
+
+def compressed_variants(content):
+    """ {encoding: (suffix, compressed content)} of variants noticeably smaller than content """
+
+    variants = {"gzip": (".gz", gzip.compress(content, 9, mtime=0))}
+    brotli = brotli_module()
+    if brotli is not None:
+        variants["br"] = (".br", brotli.compress(content, quality=11))
+    return {encoding: (suffix, compressed) for encoding, (suffix, compressed) in variants.items()
+            if len(compressed) <= len(content) * (1 - MIN_SAVING)}
+
+
+def build_assets(source, target):
+    """ copy every file of source directory to target under content hashed name with its gzip/brotli
+        copies and write manifest {source name: {"file": hashed name, "encodings": [...]}},
+        files of previous builds are removed, returns the manifest """
+
+    manifest = {}
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+    for directory, _, files in os.walk(source):
+        for filename in sorted(files):
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, source).replace(os.sep, "/")
+            with open(path, "rb") as asset_file:
+                content = asset_file.read()
+            hashed = hashed_name(name, content)
+            os.makedirs(os.path.dirname(os.path.join(target, hashed)), exist_ok=True)
+            with open(os.path.join(target, hashed), "wb") as asset_file:
+                asset_file.write(content)
+            variants = compressed_variants(content)
+            for suffix, compressed in variants.values():
+                with open(os.path.join(target, hashed + suffix), "wb") as asset_file:
+                    asset_file.write(compressed)
+            manifest[name] = {"file": hashed, "encodings": sorted(variants)}
+    with open(os.path.join(target, MANIFEST), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(directory):
+    """ manifest written by build_assets, empty when assets weren't built """
+
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+def init_assets(app):
+    """ read asset manifest of ASSETS_DIR once per worker, build it with flask build-assets """
+
+    manifest = load_manifest(app.config["ASSETS_DIR"]) if app.config.get("ASSETS_DIR") else {}
+    app.extensions["asset_manifest"] = manifest
+    app.extensions["asset_files"] = {entry["file"]: entry for entry in manifest.values()}
+
+
+@assets.app_template_global()
+def asset_url(filename):
+    """ url of static file through manifest, plain static url when assets weren't built """
+
+    entry = current_app.extensions["asset_manifest"].get(filename)
+    if entry is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.serve_asset', filename=entry["file"])
+
+
+def preferred_encoding(encodings):
+    """ best of precompressed encodings client accepts, None for identity """
+
+    for encoding in ("br", "gzip"):
+        if encoding in encodings and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+@assets.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """ hashed asset with immutable caching, precompressed variant when client accepts it """
+
+    entry = current_app.extensions["asset_files"].get(filename)
+    if entry is None:
+        abort(404)
+    encoding = preferred_encoding(entry["encodings"])
+    suffix = {"br": ".br", "gzip": ".gz", None: ""}[encoding]
+    response = send_from_directory(os.path.abspath(current_app.config["ASSETS_DIR"]), filename + suffix,
+                                   mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                                   conditional=True)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if entry["encodings"]:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = IMMUTABLE.format(current_app.config["ASSET_MAX_AGE"])
+    return response
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from flask_migrate import upgrade
+
+from app import create_app
+from models import db, Availability, Goal, Teacher
+from generate_data import fill_database
+from query_budget import QueryCounter
+
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def scratch_files(directory):
+    """ config keys of files the app keeps next to its database, pointed into directory,
+        so a throwaway database never shares them with the one in data/ """
+
+    return {"REQUEST_QUEUE_PATH": os.path.join(directory, "request_queue.db"),
+            "SLOT_EVENTS_PATH": os.path.join(directory, "slot_events.db"),
+            "GOAL_CATALOG_VERSION_FILE": os.path.join(directory, "goals.version"),
+            "FACET_SUMMARY_VERSION_FILE": os.path.join(directory, "facets.version"),
+            "GOAL_INDEX_VERSION_FILE": os.path.join(directory, "goal_index.version"),
+            "RANDOM_KEYS_VERSION_FILE": os.path.join(directory, "random_keys.version"),
+            "TEMPLATE_CACHE_DIR": os.path.join(directory, "template_cache"),
+            "ASSETS_DIR": os.path.join(directory, "assets")}
+
+
+def percentile(values, share):
+    """ nearest rank percentile of not empty list """
+
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(share * len(ordered))) - 1))]
+
+
+def build_routes(rng):
+    """ {name: function returning (method, url, form data)} with urls pointing to existing rows """
+
+    teacher_ids = [teacher_id for teacher_id, in db.session.query(Teacher.id)]
+    goals = [name for name, in db.session.query(Goal.name)]
+    free_slots = db.session.query(Availability.teacher_id, Availability.weekday, Availability.time) \
+        .filter(Availability.booked.is_(False)).all()
+    rng.shuffle(free_slots)
+    booking_form = {"name": "Benchmark", "phone": "1234567"}
+
+    def booking_url(slot):
+        teacher_id, day, slot_time = slot
+        return "/booking/{}/{}/{}/".format(teacher_id, day, slot_time.replace(":00", ""))
+
+    return {
+        "render_index": lambda: ("GET", "/", None),
+        "render_all random": lambda: ("GET", "/all/", None),
+        "render_all rating": lambda: ("GET", "/all/?selected=2", None),
+        "render_all price desc": lambda: ("GET", "/all/?selected=3", None),
+        "render_all price asc": lambda: ("GET", "/all/?selected=4", None),
+        "render_all facets": lambda: ("GET", "/all/?selected=2&goal={}&price=1000-1500&rating=4.5&free=1"
+                                             .format(rng.choice(goals)), None),
+        "render_goal": lambda: ("GET", "/goals/{}/".format(rng.choice(goals)), None),
+        "render_teacher": lambda: ("GET", "/profiles/{}/".format(rng.choice(teacher_ids)), None),
+        "route_request GET": lambda: ("GET", "/request/", None),
+        "route_request POST": lambda: ("POST", "/request/", dict(booking_form, goal=rng.choice(goals), time="1-2")),
+        "route_booking GET": lambda: ("GET", booking_url(rng.choice(free_slots)), None),
+        "route_booking POST": lambda: ("POST", booking_url(free_slots.pop()), booking_form),
+    }
+
+
+def run_route(client, make_request, iterations, warmup):
+    timings, queries = [], []
+    for iteration in range(warmup + iterations):
+        method, url, form = make_request()
+        with QueryCounter(db.engine) as counter:
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=form)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError("{} {} answered {}".format(method, url, response.status_code))
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(counter))
+    return {"p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3),
+            "queries_per_request": round(sum(queries) / len(queries), 2)}
+
+
+def run(teachers, seed, iterations, warmup):
+    """ benchmark every route against temporary sqlite database with generated catalog """
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(dict(scratch_files(directory),
+                              SQLALCHEMY_DATABASE_URI="sqlite:///" + os.path.join(directory, "benchmark.db"),
+                              WTF_CSRF_ENABLED=False))
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            started = time.perf_counter()
+            fill_database(teachers, seed)
+            fill_seconds = time.perf_counter() - started
+            rng = random.Random(seed)
+            routes = build_routes(rng)
+            db.session.remove()
+
+        client = app.test_client()
+        with app.app_context():
+            results = {name: run_route(client, make_request, iterations, warmup)
+                       for name, make_request in routes.items()}
+            db.session.remove()
+            db.engine.dispose()
+
+    return {"meta": {"date": datetime.now().isoformat(timespec="seconds"),
+                     "teachers": teachers,
+                     "seed": seed,
+                     "iterations": iterations,
+                     "fill_seconds": round(fill_seconds, 2),
+                     "python": platform.python_version(),
+                     "sqlite": sqlite3.sqlite_version},
+            "routes": results}
+
+
+def compare(results, baseline, tolerance):
+    """ list of regressions against baseline results: slower p95 or more queries per request """
+
+    regressions = []
+    for name, current in results["routes"].items():
+        previous = baseline["routes"].get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append("{}: p95 {} ms -> {} ms".format(name, previous["p95_ms"], current["p95_ms"]))
+        if current["queries_per_request"] > previous["queries_per_request"]:
+            regressions.append("{}: queries per request {} -> {}".format(
+                name, previous["queries_per_request"], current["queries_per_request"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="latency and sql statements of every route on generated catalog")
+    parser.add_argument("--teachers", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="results file of previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown share")
+    args = parser.parse_args()
+
+    results = run(args.teachers, args.seed, args.iterations, args.warmup)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    for name, route in results["routes"].items():
+        print("{:24} p50 {p50_ms:8.2f}  p95 {p95_ms:8.2f}  p99 {p99_ms:8.2f} ms  "
+              "{queries_per_request:5.2f} queries".format(name, **route))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            raise SystemExit(1)
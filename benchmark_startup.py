@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATABASE = os.path.join(ROOT, "data", "data_base.db")
+
+
+def probe(database, url, preload, template_cache):
+    """ one cold start measured inside fresh interpreter: import, create_app, warm_up, first request,
+        with preload the first request is served by forked child like a gunicorn --preload worker """
+
+    started = time.perf_counter()
+    from app import create_app, warm_up
+    imported = time.perf_counter()
+    config = {"SQLALCHEMY_DATABASE_URI": "sqlite:///" + database, "MIGRATIONS": False}
+    if not template_cache:
+        config["TEMPLATE_CACHE_DIR"] = None
+    app = create_app(config)
+    created = time.perf_counter()
+    warm_up(app)
+    warmed = time.perf_counter()
+    timings = {"import_ms": (imported - started) * 1000,
+               "create_app_ms": (created - imported) * 1000,
+               "warm_up_ms": (warmed - created) * 1000}
+
+    def first_request():
+        request_started = time.perf_counter()
+        status = app.test_client().get(url).status_code
+        if status != 200:
+            raise RuntimeError("{} answered {}".format(url, status))
+        return (time.perf_counter() - request_started) * 1000
+
+    if not preload:
+        timings["first_request_ms"] = first_request()
+        return timings
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, str(first_request()).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as result:
+        timings["first_request_ms"] = float(result.read())
+    os.waitpid(pid, 0)
+    return timings
+
+
+def import_ms(module):
+    """ time to import module in fresh interpreter """
+
+    code = "import time; started = time.perf_counter(); import {}; print((time.perf_counter() - started) * 1000)"
+    output = subprocess.run([sys.executable, "-c", code.format(module)], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output)
+
+
+def run(runs, url, preload, template_cache):
+    """ median of every phase over runs cold starts, each in its own interpreter on a copy of the database """
+
+    # imported here, not at the top: the probe runs this file too and times importing the app itself
+    from benchmark import scratch_files
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "startup.db")
+        shutil.copyfile(DATABASE, database)
+        environment = dict(os.environ, **scratch_files(directory))
+        samples = []
+        for _ in range(runs):
+            command = [sys.executable, os.path.abspath(__file__), "--probe", "--database", database, "--url", url]
+            if preload:
+                command.append("--preload")
+            if not template_cache:
+                command.append("--no-template-cache")
+            started = time.perf_counter()
+            output = subprocess.run(command, cwd=ROOT, env=environment, check=True, capture_output=True,
+                                    text=True).stdout
+            sample = json.loads(output)
+            sample["process_ms"] = (time.perf_counter() - started) * 1000
+            samples.append(sample)
+        results = {phase: round(statistics.median(sample[phase] for sample in samples), 1) for phase in samples[0]}
+    results["import_fill_db_ms"] = round(statistics.median(import_ms("fill_db") for _ in range(runs)), 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cold start time of app: import, create_app, warm_up, first request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--url", default="/")
+    parser.add_argument("--preload", action="store_true",
+                        help="serve first request from forked child as gunicorn --preload does")
+    parser.add_argument("--no-template-cache", dest="template_cache", action="store_false",
+                        help="compile templates from source as if TEMPLATE_CACHE_DIR was not set")
+    parser.add_argument("--output", help="write medians to json file")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--database", default=DATABASE, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.database, args.url, args.preload, args.template_cache)))
+        raise SystemExit(0)
+
+    results = run(args.runs, args.url, args.preload, args.template_cache)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    for phase, milliseconds in results.items():
+        print("{:20} {:8.1f} ms".format(phase, milliseconds))
@@ -0,0 +1,65 @@
+import fcntl
+import os
+from collections import namedtuple
+
+
+CachedGoal = namedtuple("CachedGoal", ["id", "name", "value", "updated_at"])
+
+
+class VersionCounter:
+    """ integer counter kept in a file, so a bump is seen by every worker process,
+        a bump writes the next value aside and renames it over the file, so get() never reads it half written """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self):
+        try:
+            with open(self.path) as counter_file:
+                return int(counter_file.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        # the lock is held on a file of its own, the counter file itself is replaced by every bump
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            version = self.get() + 1
+            temporary = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(temporary, "w") as counter_file:
+                counter_file.write(str(version))
+            os.replace(temporary, self.path)
+        return version
+
+
+class GoalCatalog:
+    """ goals table loaded once per worker, reloaded when shared version counter changes """
+
+    def __init__(self, load, counter):
+        self.load = load
+        self.counter = counter
+        self.state = (None, [], {})
+
+    def refresh(self):
+        version = self.counter.get()
+        if version != self.state[0]:
+            goals = [CachedGoal(goal.id, goal.name, goal.value, goal.updated_at) for goal in self.load()]
+            self.state = (version, goals, {goal.name: goal for goal in goals})
+        return self.state
+
+    @property
+    def version(self):
+        return self.refresh()[0]
+
+    def all(self):
+        """ list of goals ordered by id """
+
+        return self.refresh()[1]
+
+    def get(self, name):
+        """ goal by name or None """
+
+        return self.refresh()[2].get(name)
+
+    def invalidate(self):
+        self.counter.bump()
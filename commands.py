@@ -0,0 +1,217 @@
+import json
+import os
+import tempfile
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from assets import build_assets
+from export import EXPORT_FORMATS, EXPORTS, Watermark, encode, export_rows
+from extensions import facet_summary, random_keys
+from models import db, RANDOM_KEY_RANGE, Availability, Booking, Request, Teacher
+from queries import SORT_MODES, filter_teachers, goal_teachers, keyset_filter, match_teachers, ordered_teachers, \
+    profile_teacher, rebuild_free_masks, slot_times_between
+from query_budget import check_budgets
+from query_plans import explain, unindexed_steps
+from schedule import days, overlap, to_mask
+from template_cache import compile_templates
+
+
+@click.command('reroll-random-keys')
+@with_appcontext
+def reroll_random_keys():
+    """ give every teacher new random_key so sampled neighbours change, run periodically,
+        version bump gives random '/all/' new etag and seed and ends cursors into the old order """
+
+    db.session.query(Teacher).update({Teacher.random_key: db.func.random().op('&')(RANDOM_KEY_RANGE - 1)},
+                                     synchronize_session=False)
+    db.session.commit()
+    random_keys.bump()
+
+
+@click.command('rebuild-free-masks')
+@with_appcontext
+def rebuild_free_masks_command():
+    """ recompute teachers.free_mask from availability, after editing availability by hand """
+
+    print('rebuilt {} teachers'.format(rebuild_free_masks()))
+    db.session.commit()
+    facet_summary.invalidate()
+
+
+@click.command('match-request')
+@click.argument('request_id', type=int)
+@click.option('--day', 'preferred_days', multiple=True, type=click.Choice(list(days)), help='preferred day, repeatable')
+@click.option('--from', 'hour_from', type=int, help='preferred hours start')
+@click.option('--to', 'hour_to', type=int, help='preferred hours end')
+@click.option('--limit', type=int, default=10)
+@with_appcontext
+def match_request_command(request_id, preferred_days, hour_from, hour_to, limit):
+    """ print teachers whose free slots fit lesson request best """
+
+    lesson_request = db.session.query(Request).get(request_id)
+    if lesson_request is None:
+        raise click.ClickException('request {} not found'.format(request_id))
+    preferred = to_mask({day: {time: True for time in slot_times_between(hour_from, hour_to)}
+                         for day in preferred_days or days})
+    for teacher in match_teachers(lesson_request, preferred, limit):
+        print('{:>6} {:<30} {:>4} {}'.format(teacher.id, teacher.name, teacher.rating,
+                                             overlap(teacher.free_mask, preferred)))
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans():
+    """ print plan of main query of every route and fail if some of them doesn't use an index """
+
+    queries = {
+        'render_index': ordered_teachers(Teacher.random_key, False).filter(Teacher.random_key >= 0),
+        'render_all random': keyset_filter(ordered_teachers(Teacher.random_key, False)
+                                           .filter(Teacher.random_key >= 0), Teacher.random_key, False, (0, 0)),
+        'all_validators': db.session.query(db.func.max(Teacher.updated_at)),
+        'render_all facets': filter_teachers(ordered_teachers(Teacher.rating, True), goal_id=1, price='1000-1500',
+                                             min_rating=4.5, free=True),
+        'render_goal': db.session.query(Teacher).filter(Teacher.id.in_([0, 1, 2])),
+        'match_teachers': goal_teachers(1),
+        'teacher_validators': db.session.query(Teacher.updated_at,
+                                               db.session.query(db.func.max(Availability.updated_at))
+                                               .filter(Availability.teacher_id == Teacher.id).as_scalar())
+                                        .filter(Teacher.id == 0),
+        'render_teacher': profile_teacher(0),
+        'route_booking': db.session.query(Availability).filter(Availability.teacher_id == 0,
+                                                               Availability.weekday == 'mon',
+                                                               Availability.time == '8:00'),
+        'render_free': db.session.query(Availability.teacher_id)
+                                 .filter(db.not_(Availability.booked), Availability.weekday == 'wed',
+                                         Availability.time.in_(['18:00', '20:00'])),
+        'teacher bookings': db.session.query(Booking).filter(Booking.teacher_id == 0),
+        'goal requests': db.session.query(Request).filter(Request.goal_id == 1),
+    }
+    for selected_value, (key, descending, key_type) in SORT_MODES.items():
+        teachers = keyset_filter(ordered_teachers(key, descending), key, descending, (key_type(0), 0))
+        queries['render_all selected={}'.format(selected_value)] = teachers
+
+    # goal subset is found by index and is small enough to be sorted in memory
+    sorted_in_memory = {'match_teachers', 'render_all facets'}
+
+    failed = False
+    for name, query in queries.items():
+        plan = explain(db.session, query)
+        bad_steps = unindexed_steps(plan, allow_sort=name in sorted_in_memory)
+        failed = failed or bool(bad_steps)
+        print('{} {}'.format('FAIL' if bad_steps else 'ok  ', name))
+        for step in plan:
+            print('      {}'.format(step))
+    if failed:
+        raise SystemExit(1)
+
+
+ROUTE_QUERY_BUDGETS = {
+    '/': 2,
+    '/all/': 3,
+    '/all/?selected=2': 2,
+    '/all/?selected=2&goal=travel&price=1000-1500&rating=4.5&free=1': 2,
+    '/goals/travel/': 2,
+    '/profiles/0/': 2,
+    '/request/': 0,
+    '/search/?q=a': 1,
+    '/free/?day=wed&from=18&to=20&goal=travel&max_price=2000': 1,
+    '/booking/0/mon/10/': 1,
+}
+
+
+@click.command('check-query-budgets')
+@with_appcontext
+def check_query_budgets():
+    """ fail if some route sends more sql statements than ROUTE_QUERY_BUDGETS allows """
+
+    over_budget = check_budgets(current_app.test_client(), db.engine, ROUTE_QUERY_BUDGETS)
+    for url, statements in over_budget.items():
+        print('FAIL {} {} statements, budget {}'.format(url, len(statements), ROUTE_QUERY_BUDGETS[url]))
+        for statement in statements:
+            print('      {}'.format(' '.join(statement.split())))
+    if over_budget:
+        raise SystemExit(1)
+    print('ok   {} routes within budget'.format(len(ROUTE_QUERY_BUDGETS)))
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """ build step: compile every template into TEMPLATE_CACHE_DIR, so workers only load bytecode """
+
+    bytecode_cache = current_app.jinja_env.bytecode_cache
+    if bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set')
+    bytecode_cache.clear()
+    names = compile_templates(current_app)
+    print('compiled {} templates into {}'.format(len(names), bytecode_cache.directory))
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """ build step: copy static files to ASSETS_DIR under content hashed names with compressed copies """
+
+    manifest = build_assets(current_app.static_folder, current_app.config['ASSETS_DIR'])
+    for name, entry in sorted(manifest.items()):
+        print('{} -> {} {}'.format(name, entry['file'], ' '.join(entry['encodings'])))
+
+
+def read_watermarks(path):
+    """ {table: last exported id} kept between incremental exports """
+
+    try:
+        with open(path) as watermarks_file:
+            return json.load(watermarks_file)
+    except FileNotFoundError:
+        return {}
+
+
+def write_atomically(path, chunks):
+    """ write text chunks aside and rename, a failed export never leaves half a file """
+
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8', newline='') as target:
+            for chunk in chunks:
+                target.write(chunk)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+@click.command('export')
+@click.argument('tables', nargs=-1, type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--output-dir', default='.', type=click.Path(file_okay=False), help='directory for <table>.<format>')
+@click.option('--watermarks', type=click.Path(dir_okay=False),
+              help='json file with last exported id per table, export continues after it and updates it')
+@with_appcontext
+def export_command(tables, export_format, output_dir, watermarks):
+    """ stream bookings (with teacher name) and lesson requests (with goal value) to files, all tables
+        are read in one transaction, so they come from the same WAL snapshot while workers keep writing """
+
+    marks = read_watermarks(watermarks) if watermarks else {}
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        for table in tables or list(EXPORTS):
+            watermark = Watermark(marks.get(table))
+            columns, rows = export_rows(table, watermark.last_id)
+            path = os.path.join(output_dir, '{}.{}'.format(table, export_format))
+            write_atomically(path, encode(columns, watermark.track(rows), export_format))
+            marks[table] = watermark.last_id
+            print('{} {} rows, last id {}'.format(path, watermark.count, watermark.last_id))
+    finally:
+        db.session.rollback()
+    if watermarks:
+        write_atomically(watermarks, [json.dumps(marks, indent=2, sort_keys=True)])
+
+
+def init_commands(app):
+    for command in (reroll_random_keys, rebuild_free_masks_command, match_request_command,
+                    check_query_plans, check_query_budgets, compile_templates_command, build_assets_command,
+                    export_command):
+        app.cli.add_command(command)
@@ -0,0 +1,36 @@
+import gzip
+
+from flask import current_app, request
+
+
+def should_compress(response):
+    config = current_app.config
+    return (response.status_code == 200
+            and response.mimetype in config["COMPRESS_MIMETYPES"]
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and "Content-Encoding" not in response.headers
+            and response.content_length is not None
+            and response.content_length >= config["COMPRESS_MIN_SIZE"]
+            and request.accept_encodings["gzip"])
+
+
+def compress_response(response):
+    if response.mimetype in current_app.config["COMPRESS_MIMETYPES"]:
+        response.vary.add("Accept-Encoding")
+    if not should_compress(response):
+        return response
+    response.set_data(gzip.compress(response.get_data(), current_app.config["COMPRESS_LEVEL"]))
+    response.headers["Content-Encoding"] = "gzip"
+    etag, _ = response.get_etag()
+    if etag is not None:
+        # the same page in another encoding is a different byte sequence, so only weakly equal
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """ gzip html and json responses of at least COMPRESS_MIN_SIZE bytes, smaller ones aren't worth
+        the cpu, files and streams are left alone """
+
+    app.after_request(compress_response)
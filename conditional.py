@@ -0,0 +1,54 @@
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+
+def make_etag(*parts):
+    """ etag from row versions and other values page depends on """
+
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        # weak comparison, conditional pages carry weak etags
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional(get_validators):
+    """ view decorator answering 304 to GET before the view runs when client copy is current,
+        get_validators(**view_args) returns (etag, last_modified) or calls abort(), etag is sent weak """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            etag, last_modified = get_validators(*args, **kwargs)
+            if is_not_modified(etag, last_modified):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            # weak on 200 and 304 alike: etag stands for the page data, not its bytes, and the 200 may be
+            # gzipped (see compression.py), a cache merging 304 headers must not get a strong etag for it
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def no_store(view):
+    """ view decorator for pages that must never be cached, e.g. forms with csrf token """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        response.cache_control.no_store = True
+        return response
+    return wrapper
@@ -1,13 +1,12 @@
+from schedule import days, times  # noqa: F401 kept for scripts reading data.days and data.times
+
+
 goals = {"travel": "Для путешествий",
          "study": "Для учебы",
          "work": "Для работы",
          "relocate": "Для переезда",
          "programming": "Для программирования"}
 
-days = {"mon": 'Понедельник', "tue": 'Вторник', "wed": 'Среда', "thu": 'Четверг',
-        "fri": 'Пятница', "sat": 'Суббота', "sun": 'Воскресенье'}
-
-
 teachers = [
 
     {
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+
+from models import db, Booking, Goal, Request, Teacher
+
+
+CHUNK_SIZE = 500
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def bookings_rows():
+    return db.session.query(Booking.id, Booking.name, Booking.phone, Booking.weekday, Booking.time,
+                            Booking.teacher_id, Teacher.name.label("teacher_name")) \
+        .outerjoin(Teacher, Teacher.id == Booking.teacher_id)
+
+
+def requests_rows():
+    return db.session.query(Request.id, Request.name, Request.phone, Request.time,
+                            Request.goal_id, Goal.value.label("goal")) \
+        .outerjoin(Goal, Goal.id == Request.goal_id)
+
+
+# table name -> (query of rows, id column the watermark is kept on)
+EXPORTS = {"bookings": (bookings_rows, Booking.id),
+           "requests": (requests_rows, Request.id)}
+
+
+def export_rows(table, after_id=None):
+    """ (column names, rows of table with id above after_id watermark in id order), rows are fetched
+        CHUNK_SIZE at a time from one cursor, so memory doesn't grow with table size. In WAL mode
+        every row comes from the snapshot taken by the first read of the transaction """
+
+    query, id_column = EXPORTS[table]
+    rows = query()
+    if after_id is not None:
+        rows = rows.filter(id_column > after_id)
+    return [column["name"] for column in rows.column_descriptions], rows.order_by(id_column).yield_per(CHUNK_SIZE)
+
+
+def encode_csv(columns, rows):
+    """ csv text generated chunk by chunk, header line first """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(columns, rows):
+    """ one json object per line generated chunk by chunk """
+
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+        if len(lines) == CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+def encode(columns, rows, export_format):
+    return encode_csv(columns, rows) if export_format == "csv" else encode_ndjson(columns, rows)
+
+
+class Watermark:
+    """ wraps exported rows and remembers the largest id that went out, the next incremental
+        export starts after it """
+
+    def __init__(self, after_id=None):
+        self.last_id = after_id
+        self.count = 0
+
+    def track(self, rows):
+        for row in rows:
+            self.last_id = row.id
+            self.count += 1
+            yield row
@@ -0,0 +1,161 @@
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from werkzeug.local import LocalProxy
+
+from catalog import GoalCatalog, VersionCounter
+from facets import FacetSummary
+from fragments import FragmentCache
+from goal_index import GoalIndex
+from models import db, teachers_goals_association, Goal, Request, Teacher
+from slot_events import SlotEventBus
+from write_behind import WriteBehindQueue
+
+
+# per app objects made by init_extensions, proxies resolve them through current_app
+goal_catalog = LocalProxy(lambda: current_app.extensions["goal_catalog"])
+teacher_cards = LocalProxy(lambda: current_app.extensions["teacher_cards"])
+request_queue = LocalProxy(lambda: current_app.extensions["request_queue"])
+facet_summary = LocalProxy(lambda: current_app.extensions["facet_summary"])
+goal_index = LocalProxy(lambda: current_app.extensions["goal_index"])
+slot_events = LocalProxy(lambda: current_app.extensions["slot_events"])
+random_keys = LocalProxy(lambda: current_app.extensions["random_keys"])
+
+
+def load_goals():
+    return db.session.query(Goal).order_by(Goal.id).all()
+
+
+def load_facets():
+    """ (teacher id, price, rating, has free slots) rows and (teacher id, goal id) pairs of facet summary """
+
+    teachers = db.session.query(Teacher.id, Teacher.price, Teacher.rating, Teacher.free_mask != 0).all()
+    teacher_goals = db.session.query(teachers_goals_association.c.teacher_id,
+                                     teachers_goals_association.c.goal_id).all()
+    return teachers, teacher_goals
+
+
+def load_goal_index(teacher_ids=None):
+    """ (teacher id, rating, price, goal id or None) rows of goal index, of teacher_ids only when given """
+
+    rows = db.session.query(Teacher.id, Teacher.rating, Teacher.price, teachers_goals_association.c.goal_id) \
+        .outerjoin(teachers_goals_association, teachers_goals_association.c.teacher_id == Teacher.id)
+    if teacher_ids is not None:
+        rows = rows.filter(Teacher.id.in_(teacher_ids))
+    return rows.all()
+
+
+def insert_requests(app, records):
+    """ write batch of queued lesson requests in one transaction """
+
+    with app.app_context():
+        try:
+            db.session.execute(Request.__table__.insert(), records)
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def init_extensions(app):
+    """ bind db to app and make goal catalog, facet summary, goal index, teacher card cache, request queue,
+        slot event bus and random keys version of app,
+        Flask-Migrate is registered only when MIGRATIONS is on, importing alembic is slow """
+
+    db.init_app(app)
+    if app.config["MIGRATIONS"]:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    app.extensions["goal_catalog"] = GoalCatalog(load_goals, VersionCounter(app.config["GOAL_CATALOG_VERSION_FILE"]))
+    app.extensions["facet_summary"] = FacetSummary(load_facets,
+                                                   VersionCounter(app.config["FACET_SUMMARY_VERSION_FILE"]))
+    app.extensions["goal_index"] = GoalIndex(load_goal_index, VersionCounter(app.config["GOAL_INDEX_VERSION_FILE"]))
+    app.extensions["teacher_cards"] = FragmentCache(app.config["TEACHER_CARD_CACHE_BYTES"])
+    app.extensions["request_queue"] = WriteBehindQueue(app.config["REQUEST_QUEUE_PATH"],
+                                                       lambda records: insert_requests(app, records),
+                                                       app.config["REQUEST_BATCH_SIZE"],
+                                                       app.config["REQUEST_MAX_LATENCY"])
+    app.extensions["slot_events"] = SlotEventBus(app.config["SLOT_EVENTS_PATH"],
+                                                 app.config["SLOT_EVENTS_POLL_INTERVAL"])
+    # bumped by reroll-random-keys, bulk update moves neither updated_at nor any other version
+    app.extensions["random_keys"] = VersionCounter(app.config["RANDOM_KEYS_VERSION_FILE"])
+
+
+# attributes counted by facet summary, teachers_goals rows change with goals/teachers collections
+FACET_ATTRIBUTES = {Teacher: ("price", "rating", "free_mask", "goals"), Goal: ("teachers",)}
+
+
+def changes_facets(obj, dirty):
+    """ True if written obj is a teacher or goal whose facet attributes changed, new and deleted always do """
+
+    names = FACET_ATTRIBUTES.get(type(obj))
+    if names is None:
+        return False
+    return not dirty or any(db.inspect(obj).attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(db.session, "after_flush")
+def track_goal_changes(session, flush_context):
+    """ remember that goals or facets of teachers were written, caches are invalidated only after commit """
+
+    if any(isinstance(obj, Goal) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["goals_changed"] = True
+    if any(changes_facets(obj, False) for obj in chain(session.new, session.deleted)) \
+            or any(changes_facets(obj, True) for obj in session.dirty):
+        session.info["facets_changed"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def invalidate_goal_catalog(session):
+    if session.info.pop("goals_changed", False):
+        goal_catalog.invalidate()
+    if session.info.pop("facets_changed", False):
+        facet_summary.invalidate()
+    teacher_ids = session.info.pop("goal_index_teachers", None)
+    if teacher_ids:
+        goal_index.update(teacher_ids)
+
+
+@event.listens_for(db.session, "after_rollback")
+def forget_goal_changes(session):
+    session.info.pop("goals_changed", None)
+    session.info.pop("facets_changed", None)
+    session.info.pop("goal_index_teachers", None)
+
+
+def track_goal_index(teacher, teacher_ids):
+    """ remember teachers whose goal index entries must be reloaded after commit """
+
+    object_session(teacher).info.setdefault("goal_index_teachers", set()).update(teacher_ids)
+
+
+@event.listens_for(Teacher, "after_insert")
+@event.listens_for(Teacher, "after_delete")
+def track_teacher_rows(mapper, connection, teacher):
+    track_goal_index(teacher, [teacher.id])
+
+
+@event.listens_for(Teacher, "after_update")
+def track_teacher_sort_keys(mapper, connection, teacher):
+    """ after_update fires for every dirty teacher, e.g. one that got a booking, only rating, price
+        and goals matter to the index """
+
+    state = db.inspect(teacher)
+    if any(state.attrs[name].history.has_changes() for name in ("rating", "price", "goals")):
+        track_goal_index(teacher, [teacher.id])
+
+
+@event.listens_for(Goal, "after_update")
+def track_goal_teachers(mapper, connection, goal):
+    """ teachers_goals rows written from goal side of the relationship """
+
+    added, _, deleted = db.inspect(goal).attrs.teachers.history
+    if added or deleted:
+        track_goal_index(goal, [teacher.id for teacher in chain(added, deleted)])
+
+
+@event.listens_for(Teacher, "after_update")
+@event.listens_for(Teacher, "after_delete")
+def evict_teacher_card(mapper, connection, teacher):
+    teacher_cards.evict(teacher.id)
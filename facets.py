@@ -0,0 +1,86 @@
+from collections import Counter, namedtuple
+
+
+PriceBucket = namedtuple("PriceBucket", ["key", "label", "low", "high"])
+
+# price facet of '/all/', bounds are inclusive, None is an open end
+PRICE_BUCKETS = (PriceBucket("under-1000", "до 1000 ₽", None, 999),
+                 PriceBucket("1000-1500", "1000–1499 ₽", 1000, 1499),
+                 PriceBucket("1500-2000", "1500–1999 ₽", 1500, 1999),
+                 PriceBucket("over-2000", "от 2000 ₽", 2000, None))
+PRICE_BUCKET_KEYS = {bucket.key: bucket for bucket in PRICE_BUCKETS}
+
+# minimum rating choices of '/all/', teacher rating level is number of them the rating reaches
+MIN_RATINGS = (4.0, 4.5, 4.8)
+
+
+def price_bucket(price):
+    """ key of price bucket the price falls into """
+
+    for bucket in PRICE_BUCKETS:
+        if (bucket.low is None or price >= bucket.low) and (bucket.high is None or price <= bucket.high):
+            return bucket.key
+    return None
+
+
+def rating_level(rating):
+    return sum(1 for threshold in MIN_RATINGS if rating >= threshold)
+
+
+class FacetSummary:
+    """ teacher counts of '/all/' facets kept per worker as two small tables of
+        (goal, price bucket, rating level, has free slots) -> count, rebuilt when shared version
+        counter changes, so a request adds up a few dozen cells instead of running GROUP BY per facet """
+
+    def __init__(self, load, counter):
+        self.load = load
+        self.counter = counter
+        self.state = (None, Counter(), Counter())
+
+    def refresh(self):
+        version = self.counter.get()
+        if version != self.state[0]:
+            teachers, teacher_goals = self.load()
+            cells = {}
+            teacher_cells, goal_cells = Counter(), Counter()
+            for teacher_id, price, rating, free in teachers:
+                cells[teacher_id] = (price_bucket(price), rating_level(rating), bool(free))
+                teacher_cells[cells[teacher_id]] += 1
+            for teacher_id, goal_id in teacher_goals:
+                if teacher_id in cells:
+                    goal_cells[(goal_id,) + cells[teacher_id]] += 1
+            self.state = (version, teacher_cells, goal_cells)
+        return self.state
+
+    @property
+    def version(self):
+        return self.refresh()[0]
+
+    def counts(self, goal_id=None, price=None, min_rating=None, free=False):
+        """ (teachers matching all filters, {goal_id: count}, {price bucket key: count}),
+            every facet is counted with the other filters applied but not its own """
+
+        _, teacher_cells, goal_cells = self.refresh()
+        min_level = rating_level(min_rating) if min_rating is not None else 0
+
+        def matches(cell_price, level, cell_free, check_price=True):
+            return (level >= min_level and (cell_free or not free)
+                    and (not check_price or price is None or cell_price == price))
+
+        if goal_id is None:
+            scoped = teacher_cells.items()
+        else:
+            scoped = [(cell[1:], count) for cell, count in goal_cells.items() if cell[0] == goal_id]
+        total = sum(count for cell, count in scoped if matches(*cell))
+        by_price = Counter()
+        for cell, count in scoped:
+            if matches(*cell, check_price=False):
+                by_price[cell[0]] += count
+        by_goal = Counter()
+        for cell, count in goal_cells.items():
+            if matches(*cell[1:]):
+                by_goal[cell[0]] += count
+        return total, by_goal, by_price
+
+    def invalidate(self):
+        self.counter.bump()
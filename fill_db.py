@@ -1,39 +1,160 @@
+import argparse
+import csv
 import json
+from datetime import datetime
+from itertools import islice
 
-from app import db, Teacher, Goal
-from data import teachers, goals
+from sqlalchemy import text
 
+from extensions import facet_summary, goal_catalog, goal_index
+from models import db, new_random_key, teachers_goals_association, Goal
+from queries import rebuild_free_masks
+from schedule import days, times
 
-def load_goals_to_db():
-    """ fill goals table in database """
 
-    for key, value in goals.items():
-        goal = Goal(name=key, value=value)
-        db.session.add(goal)
-    db.session.commit()
+BATCH_SIZE = 1000
+
+UPSERT_GOAL = text("""
+    INSERT INTO goals (name, value, updated_at) VALUES (:name, :value, :updated_at)
+    ON CONFLICT (name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    WHERE goals.value IS NOT excluded.value
+""")
+
+UPSERT_TEACHER = text("""
+    INSERT INTO teachers (id, name, about, rating, picture, price, random_key, version, updated_at)
+    VALUES (:id, :name, :about, :rating, :picture, :price, :random_key, 1, :updated_at)
+    ON CONFLICT (id) DO UPDATE SET name = excluded.name, about = excluded.about, rating = excluded.rating,
+                                   picture = excluded.picture, price = excluded.price,
+                                   version = teachers.version + 1, updated_at = excluded.updated_at
+    WHERE teachers.name IS NOT excluded.name OR teachers.about IS NOT excluded.about
+       OR teachers.rating IS NOT excluded.rating OR teachers.picture IS NOT excluded.picture
+       OR teachers.price IS NOT excluded.price
+""")
+
+INSERT_TEACHER_GOAL = text("""
+    INSERT OR IGNORE INTO teachers_goals (teacher_id, goal_id) VALUES (:teacher_id, :goal_id)
+""")
+
+DELETE_TEACHER_GOAL = text("""
+    DELETE FROM teachers_goals WHERE teacher_id = :teacher_id AND goal_id = :goal_id
+""")
+
+# goals of a teacher changed, its profile must not be answered from the old etag
+TOUCH_TEACHER = text("""
+    UPDATE teachers SET version = version + 1, updated_at = :updated_at WHERE id = :id
+""")
+
+# slots that already exist keep their booked flag, so re-run doesn't cancel real bookings
+INSERT_SLOT = text("""
+    INSERT OR IGNORE INTO availability (teacher_id, weekday, time, booked, updated_at)
+    VALUES (:teacher_id, :weekday, :time, :booked, :updated_at)
+""")
 
 
-def load_teachers_to_db():
-    """ fill teachers table in database """
-
-    for teacher in teachers:
-        free = json.dumps(teacher["free"])
-        db_teacher = Teacher(id=teacher["id"],
-                             name=teacher["name"],
-                             about=teacher["about"],
-                             rating=teacher["rating"],
-                             picture=teacher["picture"],
-                             price=teacher["price"],
-                             free=free,
-                             )
-        db.session.add(db_teacher)
-        for goal in teacher["goals"]:
-            db_goal = db.session.query(Goal).filter(Goal.name == goal).first()
-            db_teacher.goals.append(db_goal)
+def load_goals_to_db(goals=None):
+    """ insert or update goals table in database """
+
+    if goals is None:
+        from data import goals
+    now = str(datetime.utcnow())
+    rows = [{"name": name, "value": value, "updated_at": now} for name, value in goals.items()]
+    db.session.execute(UPSERT_GOAL, rows)
     db.session.commit()
+    goal_catalog.invalidate()
+
+
+def read_teachers(path):
+    """ iterate teachers from .csv, .jsonl/.ndjson (one object per line) or .json array file,
+        csv has id, name, about, rating, picture, price, goals (separated by ';') and free (json) columns """
+
+    with open(path, encoding="utf-8", newline="") as source:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(source):
+                yield {"id": int(row["id"]),
+                       "name": row["name"],
+                       "about": row["about"],
+                       "rating": float(row["rating"]),
+                       "picture": row["picture"],
+                       "price": int(row["price"]),
+                       "goals": [goal for goal in row["goals"].split(";") if goal],
+                       "free": json.loads(row["free"])}
+        elif path.endswith((".jsonl", ".ndjson")):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(source)
+
+
+def load_teachers_to_db(teachers=None, batch_size=BATCH_SIZE):
+    """ insert or update teachers with their goals and free slots in batches,
+        one transaction per batch, returns number of loaded teachers,
+        unknown goals and slots raise ValueError before the batch they are in is written """
+
+    if teachers is None:
+        from data import teachers
+    teachers = iter(teachers)
+    goal_ids = dict(db.session.query(Goal.name, Goal.id))
+    loaded = 0
+    while True:
+        batch = list(islice(teachers, batch_size))
+        if not batch:
+            break
+        now = str(datetime.utcnow())
+        teacher_rows, slot_rows, goals = [], [], set()
+        batch_ids = [teacher["id"] for teacher in batch]
+        stored_goals = set(db.session.query(teachers_goals_association.c.teacher_id,
+                                            teachers_goals_association.c.goal_id)
+                           .filter(teachers_goals_association.c.teacher_id.in_(batch_ids)))
+        for teacher in batch:
+            teacher_rows.append({"id": teacher["id"],
+                                 "name": teacher["name"],
+                                 "about": teacher["about"],
+                                 "rating": teacher["rating"],
+                                 "picture": teacher["picture"],
+                                 "price": teacher["price"],
+                                 "random_key": teacher["random_key"] if "random_key" in teacher else new_random_key(),
+                                 "updated_at": now})
+            for goal in teacher["goals"]:
+                if goal not in goal_ids:
+                    raise ValueError("teacher {} has unknown goal '{}'".format(teacher["id"], goal))
+                goals.add((teacher["id"], goal_ids[goal]))
+            for day, slot_times in teacher["free"].items():
+                for time, free in slot_times.items():
+                    if day not in days or time not in times:
+                        raise ValueError("teacher {} has unknown slot '{} {}'".format(teacher["id"], day, time))
+                    slot_rows.append({"teacher_id": teacher["id"], "weekday": day, "time": time,
+                                      "booked": not free, "updated_at": now})
+        db.session.execute(UPSERT_TEACHER, teacher_rows)
+        # goals dropped from the source are removed, so a re-run converges to the source
+        for statement, pairs in ((DELETE_TEACHER_GOAL, stored_goals - goals),
+                                 (INSERT_TEACHER_GOAL, goals - stored_goals)):
+            if pairs:
+                db.session.execute(statement, [{"teacher_id": teacher_id, "goal_id": goal_id}
+                                               for teacher_id, goal_id in sorted(pairs)])
+        changed = {teacher_id for teacher_id, _ in stored_goals ^ goals}
+        if changed:
+            db.session.execute(TOUCH_TEACHER, [{"id": teacher_id, "updated_at": now}
+                                               for teacher_id in sorted(changed)])
+        if slot_rows:
+            db.session.execute(INSERT_SLOT, slot_rows)
+        rebuild_free_masks(batch_ids)
+        db.session.commit()
+        loaded += len(batch)
+    facet_summary.invalidate()
+    goal_index.invalidate()
+    return loaded
 
 
 if __name__ == "__main__":
-    load_goals_to_db()
-    load_teachers_to_db()
+    parser = argparse.ArgumentParser(description="fill database with goals and teachers")
+    parser.add_argument("source", nargs="?",
+                        help="teachers .csv, .jsonl or .json file, data.teachers is used by default")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
 
+    from app import create_app
+    with create_app({"MIGRATIONS": False}).app_context():
+        load_goals_to_db()
+        teachers = read_teachers(args.source) if args.source else None
+        print("loaded {} teachers".format(load_teachers_to_db(teachers, args.batch_size)))
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """ LRU cache of rendered html fragments keyed by row id and row version,
+        oldest entries are evicted when total size goes over max_bytes """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, html):
+        html = Markup(html)
+        size = len(html.encode("utf-8"))
+        if size > self.max_bytes:
+            return html
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (version, html, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self.entries)))
+        return html
+
+    def render(self, key, version, render):
+        """ cached fragment or result of render() stored for next time """
+
+        html = self.get(key, version)
+        if html is None:
+            html = self.put(key, version, render())
+        return html
+
+    def evict(self, key):
+        with self.lock:
+            self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
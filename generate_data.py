@@ -0,0 +1,127 @@
+import argparse
+import json
+import random
+from datetime import datetime
+
+from sqlalchemy import text
+
+import data
+
+
+TIMES = data.times
+REQUEST_TIMES = ["1-2", "3-5", "5-7", "7-10"]
+
+FIRST_NAMES = ["Morris", "Lee", "Patrick", "Milan", "Mary", "Rosa", "Olga", "Anna", "Skye", "Jane",
+               "Sam", "Alex", "Kim", "Dana", "Eric", "Irina", "Victor", "Nina", "Oscar", "Paula"]
+LAST_NAMES = ["Simmons", "Parker", "Stone", "Smith", "Lee", "Brown", "Garcia", "Ivanova", "Petrov",
+              "Taylor", "Walker", "Young", "King", "Wright", "Scott", "Green", "Baker", "Adams"]
+ABOUT_PARTS = ["Репетитор американского английского языка.",
+               "Структурированная система обучения.",
+               "Готовлю к экзаменам IELTS и TOEFL.",
+               "Помогу заговорить без страха и ошибок.",
+               "Занятия строятся вокруг ваших целей и интересов.",
+               "Работаю со взрослыми и подростками.",
+               "Много разговорной практики и живой лексики.",
+               "Преподаю деловой английский для работы в международных компаниях.",
+               "Объясняю грамматику просто и понятно.",
+               "Есть опыт жизни и работы за границей."]
+
+INSERT_BOOKING = text("""
+    INSERT INTO bookings (name, phone, weekday, time, teacher_id)
+    VALUES (:name, :phone, :weekday, :time, :teacher_id)
+""")
+
+INSERT_REQUEST = text("""
+    INSERT INTO requests (name, phone, time, goal_id) VALUES (:name, :phone, :time, :goal_id)
+""")
+
+
+def phone(rng):
+    return "+7{}".format(rng.randrange(10 ** 9, 10 ** 10))
+
+
+def person(rng):
+    return "{} {}".format(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+
+
+def generate_teachers(count, rng, free_share=0.3, start_id=0):
+    """ teachers in data.teachers format, about a free_share of slots is free """
+
+    goals = list(data.goals)
+    for teacher_id in range(start_id, start_id + count):
+        yield {"id": teacher_id,
+               "name": person(rng),
+               "about": " ".join(rng.sample(ABOUT_PARTS, rng.randint(2, 6))),
+               "rating": round(rng.uniform(3.5, 5.0), 1),
+               "picture": "https://i.pravatar.cc/300?img={}".format(rng.randint(1, 70)),
+               "price": rng.randrange(500, 3100, 100),
+               "goals": rng.sample(goals, rng.randint(1, 3)),
+               "free": {day: {time: rng.random() < free_share for time in TIMES} for day in data.days},
+               "random_key": rng.getrandbits(31)}
+
+
+def book_slots(teachers, teachers_count, count, rng, bookings):
+    """ pass teachers through, taking about count of their free slots spread evenly between them,
+        every taken slot stops being free and its booking is appended to bookings """
+
+    per_teacher, extra = divmod(count, teachers_count) if teachers_count else (0, 0)
+    for left, teacher in zip(range(teachers_count, 0, -1), teachers):
+        wanted = per_teacher
+        if rng.randrange(left) < extra:
+            wanted += 1
+            extra -= 1
+        free = [(day, time) for day, times in teacher["free"].items() for time, is_free in times.items() if is_free]
+        for day, time in rng.sample(free, min(wanted, len(free))):
+            teacher["free"][day][time] = False
+            bookings.append({"name": person(rng), "phone": phone(rng), "weekday": day, "time": time,
+                             "teacher_id": teacher["id"]})
+        yield teacher
+
+
+def generate_requests(goal_ids, count, rng):
+    for _ in range(count):
+        yield {"name": person(rng), "phone": phone(rng), "time": rng.choice(REQUEST_TIMES),
+               "goal_id": rng.choice(goal_ids)}
+
+
+def fill_database(teachers_count, seed=0, bookings_count=None, requests_count=None, batch_size=1000):
+    """ fill database of current app with generated catalog of given scale,
+        the same seed always gives the same data """
+
+    from models import db, Goal
+    from fill_db import load_goals_to_db, load_teachers_to_db
+
+    rng = random.Random(seed)
+    bookings_count = teachers_count if bookings_count is None else bookings_count
+    requests_count = teachers_count // 2 if requests_count is None else requests_count
+
+    load_goals_to_db()
+    bookings = []
+    load_teachers_to_db(book_slots(generate_teachers(teachers_count, rng), teachers_count, bookings_count, rng,
+                                   bookings), batch_size)
+    if bookings:
+        db.session.execute(INSERT_BOOKING, bookings)
+    goal_ids = [goal_id for goal_id, in db.session.query(Goal.id)]
+    requests = list(generate_requests(goal_ids, requests_count, rng))
+    if requests:
+        db.session.execute(INSERT_REQUEST, requests)
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generate synthetic teachers catalog")
+    parser.add_argument("teachers", type=int, help="number of teachers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write teachers to .jsonl file instead of filling the database")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            for teacher in generate_teachers(args.teachers, random.Random(args.seed)):
+                output.write(json.dumps(teacher, ensure_ascii=False) + "\n")
+    else:
+        from app import create_app
+        started = datetime.now()
+        with create_app({"MIGRATIONS": False}).app_context():
+            fill_database(args.teachers, args.seed)
+        print("generated {} teachers in {}".format(args.teachers, datetime.now() - started))
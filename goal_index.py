@@ -0,0 +1,118 @@
+import threading
+from bisect import insort
+
+
+# sort key of (rating, price) per order, id breaks ties so every list has one stable order
+GOAL_ORDERS = {"rating": lambda rating, price: -rating,
+               "price": lambda rating, price: price}
+
+
+class GoalIndex:
+    """ ids of teachers of every goal presorted by rating and by price, kept per worker.
+        Commits of this worker are applied to it incrementally, a commit of another worker
+        (seen as shared version counter moving by more than this worker's own bumps) rebuilds it """
+
+    def __init__(self, load, counter):
+        self.load = load
+        self.counter = counter
+        self.version = None
+        self.teachers = {}
+        self.orders = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = self.counter.get()
+        if version == self.version and not self.pending:
+            return
+        with self.lock:
+            version = self.counter.get()
+            if version != self.version:
+                self.rebuild(self.load(), version)
+            elif self.pending:
+                teacher_ids, self.pending = self.pending, set()
+                self.apply(teacher_ids, self.load(teacher_ids))
+
+    def rebuild(self, rows, version):
+        teachers = {}
+        for teacher_id, rating, price, goal_id in rows:
+            teacher = teachers.setdefault(teacher_id, (rating, price, set()))
+            if goal_id is not None:
+                teacher[2].add(goal_id)
+        orders = {}
+        for teacher_id, (rating, price, goal_ids) in teachers.items():
+            for goal_id in goal_ids:
+                for name, key in GOAL_ORDERS.items():
+                    orders.setdefault(goal_id, {}).setdefault(name, []).append((key(rating, price), teacher_id))
+        for goal_orders in orders.values():
+            for entries in goal_orders.values():
+                entries.sort()
+        self.teachers, self.orders, self.version, self.pending = teachers, orders, version, set()
+
+    def apply(self, teacher_ids, rows):
+        """ replace entries of teacher_ids with rows loaded for them, touched lists are copied
+            and swapped in, so concurrent readers never see a half updated list """
+
+        fresh = {}
+        for teacher_id, rating, price, goal_id in rows:
+            teacher = fresh.setdefault(teacher_id, (rating, price, set()))
+            if goal_id is not None:
+                teacher[2].add(goal_id)
+        changed = {}
+        for teacher_id in teacher_ids:
+            for goal_id, entry in self.entries(self.teachers.get(teacher_id), teacher_id):
+                changed.setdefault(goal_id, {"removed": set(), "added": []})["removed"].add(entry)
+            for goal_id, entry in self.entries(fresh.get(teacher_id), teacher_id):
+                changed.setdefault(goal_id, {"removed": set(), "added": []})["added"].append(entry)
+            if teacher_id in fresh:
+                self.teachers[teacher_id] = fresh[teacher_id]
+            else:
+                self.teachers.pop(teacher_id, None)
+        for goal_id, change in changed.items():
+            goal_orders = dict(self.orders.get(goal_id, {}))
+            for name in GOAL_ORDERS:
+                entries = [entry for entry in goal_orders.get(name, []) if (name, entry) not in change["removed"]]
+                for added_name, entry in change["added"]:
+                    if added_name == name:
+                        insort(entries, entry)
+                goal_orders[name] = entries
+            self.orders[goal_id] = goal_orders
+
+    @staticmethod
+    def entries(teacher, teacher_id):
+        """ (goal_id, (order name, sort entry)) of teacher in every list it belongs to """
+
+        if teacher is None:
+            return
+        rating, price, goal_ids = teacher
+        for goal_id in goal_ids:
+            for name, key in GOAL_ORDERS.items():
+                yield goal_id, (name, (key(rating, price), teacher_id))
+
+    def page(self, goal_id, order, descending, offset, limit):
+        """ (ids of teachers offset to offset + limit of goal in order, number of teachers of goal),
+            descending walks the list from its end """
+
+        self.refresh()
+        entries = self.orders.get(goal_id, {}).get(order, [])
+        total = len(entries)
+        if descending:
+            window = entries[max(total - offset - limit, 0):max(total - offset, 0)][::-1]
+        else:
+            window = entries[offset:offset + limit]
+        return [teacher_id for _, teacher_id in window], total
+
+    def update(self, teacher_ids):
+        """ teachers were committed by this worker: bump shared version and, when nobody else bumped it
+            in between, reload only these teachers on next refresh """
+
+        version = self.counter.bump()
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+                self.pending |= set(teacher_ids)
+
+    def invalidate(self):
+        """ rebuild in every worker, after bulk writes that bypass the orm """
+
+        self.counter.bump()
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+
+# must be set before prometheus_client is imported by the app, see metrics.py
+metrics_dir = os.environ.setdefault("prometheus_multiproc_dir", "/tmp/tinysteps-metrics")
+
+# wsgi:app is imported and warmed once in the master, workers are forked with it ready
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+# worker mode is chosen by WORKER_CLASS, not -k: the app sizes its connection pool from the same
+# environment variables (sqlite_profile.engine_options), exported here before the app is imported
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+worker_class = os.environ.setdefault("WORKER_CLASS", "sync")
+if worker_class not in WORKER_CLASSES:
+    raise ValueError("WORKER_CLASS must be one of {}".format(", ".join(WORKER_CLASSES)))
+threads = int(os.environ.setdefault("WORKER_THREADS", "4" if worker_class == "gthread" else "1"))
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 100))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 30))
+
+if worker_class == "gevent":
+    # patched before the preloaded app creates its locks and pool queue, otherwise a greenlet
+    # waiting for a db connection would block the whole worker
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def on_starting(server):
+    """ drop metric files left by previous run """
+
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_worker_init(worker):
+    """ warn when -k or --threads on command line overrode what the db pool is sized for,
+        start write-behind flusher, so requests queued before a restart go out without waiting for a new one """
+
+    if worker.cfg.worker_class_str != worker_class or worker.cfg.threads != threads:
+        worker.log.warning("worker %s with %s threads doesn't match WORKER_CLASS=%s WORKER_THREADS=%s",
+                           worker.cfg.worker_class_str, worker.cfg.threads, worker_class, threads)
+    if worker.wsgi.config["REQUEST_WRITE_BEHIND"]:
+        worker.wsgi.extensions["request_queue"].start()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """ write out lesson requests still waiting in write-behind queue """
+
+    worker.wsgi.extensions["request_queue"].stop()
@@ -0,0 +1,207 @@
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmark import MIGRATIONS, percentile, scratch_files
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+SEARCH_WORDS = ["english", "native", "teacher", "IELTS", "grammar"]
+
+
+def prepare_database(path, teachers, seed):
+    """ migrated database with generated catalog, returns (teacher ids, goal names, free slots) """
+
+    from flask_migrate import upgrade
+
+    from app import create_app
+    from generate_data import fill_database
+    from models import db, Availability, Goal, Teacher
+
+    app = create_app(dict(scratch_files(os.path.dirname(path)), SQLALCHEMY_DATABASE_URI="sqlite:///" + path))
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        fill_database(teachers, seed)
+        teacher_ids = [teacher_id for teacher_id, in db.session.query(Teacher.id)]
+        goals = [name for name, in db.session.query(Goal.name)]
+        free_slots = db.session.query(Availability.teacher_id, Availability.weekday, Availability.time) \
+            .filter(Availability.booked.is_(False)).all()
+        db.session.remove()
+        db.engine.dispose()
+    return teacher_ids, goals, [tuple(slot) for slot in free_slots]
+
+
+def start_server(worker_class, workers, port, database, directory):
+    environment = dict(os.environ,
+                       WORKER_CLASS=worker_class,
+                       DATABASE_URL="sqlite:///" + database,
+                       prometheus_multiproc_dir=os.path.join(directory, "metrics-" + worker_class),
+                       **scratch_files(directory))
+    # queued lesson requests of an exported REQUEST_WRITE_BEHIND=1 must not drain into the throwaway database
+    environment.pop("WORKER_THREADS", None)
+    environment.pop("REQUEST_WRITE_BEHIND", None)
+    log_path = os.path.join(directory, "gunicorn-{}.log".format(worker_class))
+    with open(log_path, "w") as log:
+        server = subprocess.Popen([sys.executable, "-c", "from gunicorn.app.wsgiapp import run; run()",
+                                   "-c", "gunicorn_config.py", "-b", "127.0.0.1:{}".format(port),
+                                   "-w", str(workers), "wsgi:app"],
+                                  cwd=ROOT, env=environment, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen("http://127.0.0.1:{}/request/".format(port), timeout=1).read()
+            return server
+        except (urllib.error.URLError, ConnectionError):
+            if server.poll() is not None:
+                with open(log_path) as log:
+                    raise RuntimeError("gunicorn exited: " + log.read())
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("gunicorn didn't start in 30 seconds")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+class VirtualUser(threading.Thread):
+    """ keeps sending mixed page requests until stop is set, every booking is GET of form and POST
+        with its csrf token, records (kind, seconds, status) """
+
+    def __init__(self, base, catalog, write_share, seed, stop, samples):
+        super().__init__(daemon=True)
+        self.base = base
+        self.teacher_ids, self.goals, self.free_slots = catalog
+        self.write_share = write_share
+        self.rng = random.Random(seed)
+        self.stop = stop
+        self.samples = samples
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def send(self, kind, path, form=None):
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base + path, data=data, timeout=60) as response:
+                body = response.read().decode()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            body, status = "", error.code
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            body, status = "", 0
+        self.samples.append((kind, time.perf_counter() - started, status))
+        return body
+
+    def read_path(self):
+        return self.rng.choice([
+            "/",
+            "/all/",
+            "/all/?selected=2",
+            "/goals/{}/".format(self.rng.choice(self.goals)),
+            "/profiles/{}/".format(self.rng.choice(self.teacher_ids)),
+            "/search/?q={}".format(self.rng.choice(SEARCH_WORDS)),
+            "/free/?day={}&from=18&to=22".format(self.rng.choice(["mon", "wed", "fri"])),
+        ])
+
+    def run(self):
+        while not self.stop.is_set():
+            if self.rng.random() >= self.write_share:
+                self.send("read", self.read_path())
+                continue
+            teacher_id, day, slot_time = self.rng.choice(self.free_slots)
+            path = "/booking/{}/{}/{}/".format(teacher_id, day, slot_time.replace(":00", ""))
+            token = CSRF_TOKEN.search(self.send("read", path))
+            if token is not None:
+                self.send("write", path, {"csrf_token": token.group(1), "name": "Load", "phone": "1234567"})
+
+
+def measure(base, catalog, concurrency, seconds, write_share):
+    stop = threading.Event()
+    samples = []
+    users = [VirtualUser(base, catalog, write_share, seed, stop, samples) for seed in range(concurrency)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    time.sleep(seconds)
+    stop.set()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+    result = {"requests_per_second": round(len(samples) / elapsed, 1),
+              "errors": sum(1 for _, _, status in samples if status != 200)}
+    for kind in ("read", "write"):
+        timings = [duration * 1000 for sample_kind, duration, _ in samples if sample_kind == kind]
+        if timings:
+            result[kind] = {"p50_ms": round(percentile(timings, 0.50), 1),
+                            "p95_ms": round(percentile(timings, 0.95), 1),
+                            "p99_ms": round(percentile(timings, 0.99), 1)}
+    return result
+
+
+def run(worker_classes, levels, workers, seconds, write_share, teachers, port):
+    """ {worker class: {concurrency: result}}, each worker class serves its own copy of one generated database """
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.db")
+        catalog = prepare_database(source, teachers, seed=0)
+        for worker_class in worker_classes:
+            database = os.path.join(directory, worker_class + ".db")
+            shutil.copyfile(source, database)
+            server = start_server(worker_class, workers, port, database, directory)
+            try:
+                results[worker_class] = {}
+                for concurrency in levels:
+                    result = measure("http://127.0.0.1:{}".format(port), catalog, concurrency, seconds, write_share)
+                    results[worker_class][concurrency] = result
+                    print_result(worker_class, concurrency, result)
+            finally:
+                stop_server(server)
+    return results
+
+
+def print_result(worker_class, concurrency, result):
+    line = "{:8} c={:<4} {:8.1f} req/s  errors {:<4}".format(worker_class, concurrency,
+                                                              result["requests_per_second"], result["errors"])
+    for kind in ("read", "write"):
+        if kind in result:
+            line += "  {} p50 {p50_ms:7.1f} p95 {p95_ms:7.1f} p99 {p99_ms:7.1f} ms".format(kind, **result[kind])
+    print(line, flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="throughput and tail latency of gunicorn worker modes "
+                                                 "at increasing concurrency")
+    parser.add_argument("--worker-classes", default="sync,gthread,gevent")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma separated client counts")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of every concurrency level")
+    parser.add_argument("--write-share", type=float, default=0.1, help="share of bookings among requests")
+    parser.add_argument("--teachers", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write results to json file")
+    args = parser.parse_args()
+
+    results = run(args.worker_classes.split(","), [int(level) for level in args.concurrency.split(",")],
+                  args.workers, args.seconds, args.write_share, args.teachers, args.port)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,101 @@
+import os
+import time
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# with prometheus_multiproc_dir set (see gunicorn_config.py) every worker writes its values
+# to mmap files in that directory and /metrics sums files of all workers
+MULTIPROCESS_DIR_VARIABLE = "prometheus_multiproc_dir"
+
+REQUEST_DURATION = Histogram("tinysteps_request_duration_seconds", "Request handling time",
+                             ["endpoint", "method", "status"])
+SQL_STATEMENTS = Histogram("tinysteps_sql_statements_per_request", "SQL statements sent while handling request",
+                           ["endpoint"], buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50, 100))
+SQL_DURATION = Histogram("tinysteps_sql_duration_seconds_per_request", "Time spent in SQL while handling request",
+                         ["endpoint"])
+TEMPLATE_DURATION = Histogram("tinysteps_template_render_seconds", "Template render time",
+                              ["endpoint", "template"])
+
+
+def endpoint_label():
+    return request.url_rule.endpoint if request.url_rule is not None else "unmatched"
+
+
+def start_request_timer():
+    g.metrics = {"started": time.perf_counter(), "sql_statements": 0, "sql_seconds": 0.0, "templates": {}}
+
+
+def remember_status(response):
+    if "metrics" in g:
+        g.metrics["status"] = response.status_code
+    return response
+
+
+def observe_request(exception=None):
+    """ teardown hook, runs for requests that raised too: those count as 500 unless a response was made """
+
+    if "metrics" in g:
+        endpoint = endpoint_label()
+        REQUEST_DURATION.labels(endpoint, request.method, g.metrics.get("status", 500)) \
+            .observe(time.perf_counter() - g.metrics["started"])
+        SQL_STATEMENTS.labels(endpoint).observe(g.metrics["sql_statements"])
+        SQL_DURATION.labels(endpoint).observe(g.metrics["sql_seconds"])
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_sql_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_sql_started"].pop()
+    if has_request_context() and "metrics" in g:
+        g.metrics["sql_statements"] += 1
+        g.metrics["sql_seconds"] += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def drop_sql_timer(exception_context):
+    if exception_context.connection is not None:
+        timers = exception_context.connection.info.get("metrics_sql_started")
+        if timers:
+            timers.pop()
+
+
+def start_template_timer(sender, template, context, **extra):
+    if "metrics" in g:
+        g.metrics["templates"][template.name] = time.perf_counter()
+
+
+def observe_template(sender, template, context, **extra):
+    if "metrics" in g and template.name in g.metrics["templates"]:
+        started = g.metrics["templates"].pop(template.name)
+        TEMPLATE_DURATION.labels(endpoint_label(), template.name).observe(time.perf_counter() - started)
+
+
+def render_metrics():
+    """ all metrics in prometheus text format, summed over workers in multiprocess mode """
+
+    if MULTIPROCESS_DIR_VARIABLE in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """ register request hooks, template signals and /metrics route """
+
+    app.before_request(start_request_timer)
+    app.after_request(remember_status)
+    app.teardown_request(observe_request)
+    before_render_template.connect(start_template_timer, app)
+    template_rendered.connect(observe_template, app)
+    app.add_url_rule("/metrics", "metrics", render_metrics)
@@ -0,0 +1,59 @@
+"""full text search over teachers
+
+Revision ID: 55b6bc234b24
+Revises: 648975402074
+Create Date: 2026-10-18 11:52:55.662741
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '55b6bc234b24'
+down_revision = '648975402074'
+branch_labels = None
+depends_on = None
+
+
+# teachers_fts is an external content fts5 index over teachers.name and teachers.about kept
+# in sync by triggers. sqlite drops triggers together with their table, so a migration
+# recreating teachers (batch_alter_table) has to create TRIGGERS again.
+TRIGGERS = {
+    'teachers_fts_insert': """
+        CREATE TRIGGER teachers_fts_insert AFTER INSERT ON teachers BEGIN
+            INSERT INTO teachers_fts (rowid, name, about) VALUES (new.id, new.name, new.about);
+        END
+    """,
+    'teachers_fts_delete': """
+        CREATE TRIGGER teachers_fts_delete AFTER DELETE ON teachers BEGIN
+            INSERT INTO teachers_fts (teachers_fts, rowid, name, about) VALUES ('delete', old.id, old.name, old.about);
+        END
+    """,
+    'teachers_fts_update': """
+        CREATE TRIGGER teachers_fts_update AFTER UPDATE OF name, about ON teachers BEGIN
+            INSERT INTO teachers_fts (teachers_fts, rowid, name, about) VALUES ('delete', old.id, old.name, old.about);
+            INSERT INTO teachers_fts (rowid, name, about) VALUES (new.id, new.name, new.about);
+        END
+    """,
+}
+
+
+def upgrade():
+    op.execute("""
+        CREATE VIRTUAL TABLE teachers_fts USING fts5(
+            name, about,
+            content='teachers', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    for trigger in TRIGGERS.values():
+        op.execute(trigger)
+    op.execute("INSERT INTO teachers_fts (teachers_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute('DROP TRIGGER IF EXISTS {}'.format(name))
+    op.execute('DROP TABLE teachers_fts')
@@ -0,0 +1,36 @@
+"""updated_at tracking of teachers, goals and availability
+
+Revision ID: 648975402074
+Revises: affc179e95d7
+Create Date: 2026-10-18 11:46:38.396071
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '648975402074'
+down_revision = 'affc179e95d7'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('teachers', 'goals', 'availability')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute("UPDATE {} SET updated_at = CURRENT_TIMESTAMP".format(table))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_teachers_updated_at'), 'teachers', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_teachers_updated_at'), table_name='teachers')
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
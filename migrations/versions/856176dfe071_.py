@@ -0,0 +1,31 @@
+"""indexed random_key for teachers sampling
+
+Revision ID: 856176dfe071
+Revises: 955f6cdb0bf6
+Create Date: 2026-10-18 11:58:12.413020
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '856176dfe071'
+down_revision = '955f6cdb0bf6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('teachers') as batch_op:
+        batch_op.add_column(sa.Column('random_key', sa.Integer(), nullable=True))
+    op.execute("UPDATE teachers SET random_key = random() & 2147483647")
+    with op.batch_alter_table('teachers') as batch_op:
+        batch_op.alter_column('random_key', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_teachers_random_key'), ['random_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('teachers') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_teachers_random_key'))
+        batch_op.drop_column('random_key')
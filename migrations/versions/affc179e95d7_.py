@@ -0,0 +1,26 @@
+"""row version of teachers
+
+Revision ID: affc179e95d7
+Revises: e3bf4c33d9c7
+Create Date: 2026-10-18 11:45:28.774594
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'affc179e95d7'
+down_revision = 'e3bf4c33d9c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('teachers') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('teachers') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,98 @@
+import random
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+
+db = SQLAlchemy()
+
+RANDOM_KEY_RANGE = 2 ** 31
+
+
+def new_random_key():
+    """ random sampling key for new teacher rows """
+
+    return random.randrange(RANDOM_KEY_RANGE)
+
+
+teachers_goals_association = db.Table("teachers_goals",
+                                      db.Column("teacher_id", db.Integer, db.ForeignKey("teachers.id"),
+                                                primary_key=True),
+                                      db.Column("goal_id", db.Integer, db.ForeignKey("goals.id"),
+                                                primary_key=True),
+                                      db.Index("ix_teachers_goals_goal_id_teacher_id", "goal_id", "teacher_id")
+                                      )
+
+
+class Teacher(db.Model):
+    __tablename__ = "teachers"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    about = db.Column(db.Text, nullable=False)
+    rating = db.Column(db.Float, nullable=False, index=True)
+    picture = db.Column(db.String(), nullable=False)
+    price = db.Column(db.Integer, nullable=False, index=True)
+    random_key = db.Column(db.Integer, nullable=False, index=True, default=new_random_key)
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+    # copy of free availability slots as bits of schedule.SLOTS, availability stays the source of truth
+    free_mask = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    goals = db.relationship("Goal", secondary=teachers_goals_association, back_populates="teachers")
+
+    bookings = db.relationship("Booking", back_populates="teacher")
+    slots = db.relationship("Availability", back_populates="teacher")
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+class Availability(db.Model):
+    __tablename__ = "availability"
+
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), primary_key=True)
+    weekday = db.Column(db.String(), primary_key=True)
+    time = db.Column(db.String(), primary_key=True)
+    booked = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    teacher = db.relationship("Teacher", back_populates="slots")
+
+    # partial index holds free slots only, booking a slot drops it from the index
+    __table_args__ = (db.Index("ix_availability_free_slots", "weekday", "time", "teacher_id",
+                               sqlite_where=db.text("booked = 0")),)
+
+
+class Booking(db.Model):
+    __tablename__ = "bookings"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    phone = db.Column(db.String(), nullable=False)
+    weekday = db.Column(db.String(), nullable=False)
+    time = db.Column(db.String(), nullable=False)
+
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), index=True)
+    teacher = db.relationship("Teacher", back_populates="bookings")
+
+
+class Goal(db.Model):
+    __tablename__ = "goals"
+
+    id = db.Column(db.Integer, primary_key=True,)
+    name = db.Column(db.String(), unique=True, nullable=False)
+    value = db.Column(db.String(), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    teachers = db.relationship("Teacher", secondary=teachers_goals_association, back_populates="goals")
+    requests = db.relationship("Request", back_populates="goal")
+
+
+class Request(db.Model):
+    __tablename__ = "requests"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    phone = db.Column(db.String(), nullable=False)
+    time = db.Column(db.String(), nullable=False)
+    goal_id = db.Column(db.Integer, db.ForeignKey("goals.id"), index=True)
+    goal = db.relationship("Goal", back_populates="requests")
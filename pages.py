@@ -0,0 +1,397 @@
+import random
+
+from flask import Blueprint, abort, current_app, render_template, request, session, url_for
+from flask_wtf import FlaskForm
+from sqlalchemy.orm import joinedload, raiseload
+from wtforms import StringField, SubmitField
+from wtforms.validators import InputRequired, Length
+
+from conditional import conditional, make_etag, no_store
+from extensions import facet_summary, goal_catalog, goal_index, random_keys, request_queue, slot_events, \
+    teacher_cards
+from facets import MIN_RATINGS, PRICE_BUCKET_KEYS, PRICE_BUCKETS
+from models import db, new_random_key, Availability, Booking, Request, Teacher
+from queries import SORT_MODES, book_slot, free_teachers, profile_teacher, shuffled_teachers, slot_times_between, \
+    sorted_teachers
+from schedule import days, from_mask, times
+from search import search_teachers
+from sqlite_profile import begin_immediate
+
+
+pages = Blueprint('pages', __name__)
+
+
+class RequestForm(FlaskForm):
+    name = StringField("Вас зовут",
+                       [InputRequired(message="Необходимо указать имя")])
+    phone = StringField("Ваш телефон",
+                        [InputRequired(message="Необходимо указать телефон"),
+                         Length(min=7, max=15, message="Номер должен быть от 7 до 15-ти цифр")])
+    submit = SubmitField('Найдите мне преподавателя')
+
+
+class BookingForm(FlaskForm):
+    name = StringField("Вас зовут",
+                       validators=[InputRequired(message="Необходимо указать имя")])
+    phone = StringField("Ваш телефон",
+                        validators=[InputRequired(message="Необходимо указать телефон"),
+                                    Length(min=7, max=15, message="Номер должен быть от 7 до 15-ти цифр")])
+    submit = SubmitField('Записаться на пробный урок')
+
+
+@pages.app_template_global()
+def teacher_card(teacher):
+    """ rendered teacher_block.html for teacher, reused while teacher row version stays the same """
+
+    jinja_env = current_app.jinja_env
+    return teacher_cards.render(teacher.id, teacher.version,
+                                lambda: jinja_env.get_template('teacher_block.html').render(teacher=teacher))
+
+
+@pages.app_errorhandler(404)
+def render_not_found(error):
+    """ 404 error custom handler """
+
+    return 'Ничего не нашлось! Вот неудача, отправляйтесь на главную!\n<a href="/">TINYSTEPS</a>'
+
+
+# done
+@pages.route('/')
+def render_index():
+    """ prepare data and render route '/' """
+
+    teachers = [row.Teacher for row in shuffled_teachers(new_random_key(), None, 6)]
+    random.shuffle(teachers)
+    goals = goal_catalog.all()
+    return render_template('index.html',
+                           teachers=teachers,
+                           goals=goals)
+
+
+def parse_cursor(cursor, key_type):
+    """ split 'key_id' cursor into typed key and teacher id, None if cursor is broken """
+
+    try:
+        key, teacher_id = cursor.rsplit('_', 1)
+        return key_type(key), int(teacher_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def shuffle_seed():
+    """ per visitor start point of random order kept in session, drawn again after random keys were rerolled """
+
+    version = random_keys.get()
+    if 'shuffle_seed' not in session or session.get('shuffle_version') != version:
+        session['shuffle_seed'] = new_random_key()
+        session['shuffle_version'] = version
+    return session['shuffle_seed']
+
+
+def latest(*moments):
+    """ the most recent of given datetimes, None values are skipped """
+
+    return max((moment for moment in moments if moment is not None), default=None)
+
+
+def goals_updated_at():
+    return latest(*(goal.updated_at for goal in goal_catalog.all()))
+
+
+def all_validators():
+    """ etag and last modified of '/all/' from latest update and facet summary version, max of indexed
+        updated_at is one index lookup, added and deleted teachers and booking of the last free slot
+        move facet summary version, random order also depends on random keys version and visitor seed """
+
+    updated_at = db.session.query(db.func.max(Teacher.updated_at)).scalar()
+    seed = None if request.args.get('selected') in SORT_MODES else (random_keys.get(), shuffle_seed())
+    return make_etag(updated_at, facet_summary.version, sorted(request.args.items()), seed), updated_at
+
+
+def facet_args():
+    """ facet filters of '/all/' from query string, unknown values are ignored """
+
+    goal = goal_catalog.get(request.args.get('goal'))
+    price = request.args.get('price')
+    min_rating = request.args.get('rating', type=float)
+    return {'goal_id': goal.id if goal else None,
+            'price': price if price in PRICE_BUCKET_KEYS else None,
+            'min_rating': min_rating if min_rating in MIN_RATINGS else None,
+            'free': request.args.get('free') == '1'}
+
+
+@pages.route('/all/', methods=['POST', 'GET'])
+@conditional(all_validators)
+def render_all():
+    """ prepare data and render route '/all/' """
+
+    selected_value = request.args.get('selected')
+    per_page = current_app.config['TEACHERS_PER_PAGE']
+    filters = facet_args()
+    page_args = dict(request.args.items())
+    if selected_value in SORT_MODES:
+        cursor = parse_cursor(request.args.get('after'), SORT_MODES[selected_value][2])
+        rows = sorted_teachers(selected_value, cursor, per_page + 1, filters)
+    else:
+        # cursor into random order from before the last reroll of random keys would mix two orders,
+        # such page starts the new order over
+        page_args['keys'] = random_keys.get()
+        cursor = None
+        if request.args.get('keys', type=int) == page_args['keys']:
+            cursor = parse_cursor(request.args.get('after'), int)
+        rows = shuffled_teachers(shuffle_seed(), cursor, per_page + 1, filters)
+
+    next_url = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = '{}_{}'.format(rows[-1].sort_key, rows[-1].Teacher.id)
+        next_url = url_for('pages.render_all', **dict(page_args, after=next_cursor))
+    total, goal_counts, price_counts = facet_summary.counts(**filters)
+    return render_template('all.html',
+                           teachers=[row.Teacher for row in rows],
+                           total=total,
+                           selected=selected_value,
+                           next_url=next_url,
+                           goals=goal_catalog.all(),
+                           price_buckets=PRICE_BUCKETS,
+                           min_ratings=MIN_RATINGS,
+                           goal_counts=goal_counts,
+                           price_counts=price_counts,
+                           args=request.args)
+
+
+# goal page orders by selected value of '/all/' sort, rating first by default
+GOAL_PAGE_ORDERS = {'2': ('rating', False), '3': ('price', True), '4': ('price', False)}
+
+
+def goal_page(goal):
+    """ (goal, teacher ids of requested page, next page number or None) from goal index """
+
+    goal = goal_catalog.get(goal)
+    if goal is None:
+        abort(404)
+    order, descending = GOAL_PAGE_ORDERS.get(request.args.get('selected'), GOAL_PAGE_ORDERS['2'])
+    per_page = current_app.config['TEACHERS_PER_PAGE']
+    page = max(request.args.get('page', 1, type=int), 1)
+    teacher_ids, total = goal_index.page(goal.id, order, descending, (page - 1) * per_page, per_page)
+    return goal, teacher_ids, page + 1 if total > page * per_page else None
+
+
+def goal_validators(goal):
+    """ etag and last modified of goal page from goal row, goal index and teachers of the page """
+
+    goal, teacher_ids, next_page = goal_page(goal)
+    updated_at = db.session.query(db.func.max(Teacher.updated_at)).filter(Teacher.id.in_(teacher_ids)).scalar()
+    updated_at = latest(updated_at, goal.updated_at)
+    return make_etag(goal, goal_index.version, teacher_ids, next_page, updated_at), updated_at
+
+
+# done
+@pages.route('/goals/<goal>/')
+@conditional(goal_validators)
+def render_goal(goal):
+    """ prepare data and render route for goal, page of ids is sliced from goal index
+        and its teachers are fetched by primary key """
+
+    goal, teacher_ids, next_page = goal_page(goal)
+    teachers = {teacher.id: teacher for teacher in
+                db.session.query(Teacher).options(raiseload('*')).filter(Teacher.id.in_(teacher_ids))}
+    next_url = None
+    if next_page is not None:
+        next_url = url_for('pages.render_goal', goal=goal.name, **dict(request.args.items(), page=next_page))
+    return render_template('goal.html',
+                           goal=goal.value,
+                           teachers=[teachers[teacher_id] for teacher_id in teacher_ids if teacher_id in teachers],
+                           next_url=next_url)
+
+
+def teacher_validators(teacher_id):
+    """ etag and last modified of profile from teacher row, its slots and goal catalog """
+
+    slots_updated_at = db.session.query(db.func.max(Availability.updated_at)) \
+        .filter(Availability.teacher_id == Teacher.id) \
+        .as_scalar()
+    row = db.session.query(Teacher.updated_at, slots_updated_at).filter(Teacher.id == teacher_id).first()
+    if row is None:
+        abort(404)
+    updated_at = latest(*row, goals_updated_at())
+    return make_etag(teacher_id, goal_catalog.version, updated_at), updated_at
+
+
+# done
+@pages.route('/profiles/<int:teacher_id>/')
+@conditional(teacher_validators)
+def render_teacher(teacher_id):
+    """ prepare data and render route for teacher profile """
+
+    # all() collects rows of every goal into one teacher, first() would cut the joined rows to one
+    teachers = profile_teacher(teacher_id).all()
+    if not teachers:
+        abort(404)
+    teacher = teachers[0]
+    free = from_mask(teacher.free_mask)
+    return render_template('profile.html',
+                           teacher=teacher,
+                           free=free,
+                           days=days)
+
+
+def free_search_args():
+    """ filters of free teachers search from query string, None without valid day """
+
+    day = request.args.get('day')
+    if day not in days:
+        return None
+    goal = goal_catalog.get(request.args.get('goal'))
+    return {'day': day,
+            'slot_times': slot_times_between(request.args.get('from', type=int), request.args.get('to', type=int)),
+            'goal_id': goal.id if goal else None,
+            'min_price': request.args.get('min_price', type=int),
+            'max_price': request.args.get('max_price', type=int)}
+
+
+@pages.route('/free/')
+def render_free():
+    """ teachers free on chosen day and time range, optionally for goal and price band """
+
+    search_args = free_search_args()
+    results = None
+    if search_args is not None:
+        results = free_teachers(limit=current_app.config['SEARCH_LIMIT'], **search_args)
+    return render_template('free.html',
+                           results=results,
+                           days=days,
+                           times=times,
+                           goals=goal_catalog.all(),
+                           args=request.args)
+
+
+@pages.route('/search/')
+def render_search():
+    """ full text search of teachers by name and about, optionally within goal """
+
+    query = request.args.get('q', '')
+    goal = goal_catalog.get(request.args.get('goal'))
+    selected_value = request.args.get('selected')
+    results = search_teachers(db.session, query,
+                              goal_id=goal.id if goal else None,
+                              selected=selected_value,
+                              limit=current_app.config['SEARCH_LIMIT'])
+    return render_template('search.html',
+                           query=query,
+                           results=results,
+                           goals=goal_catalog.all(),
+                           selected_goal=goal.name if goal else None,
+                           selected=selected_value)
+
+
+# done
+@pages.route('/request/', methods=['GET', 'POST'])
+@no_store
+def route_request():
+    """ prepare data and render request route for both methods"""
+
+    write_behind = current_app.config['REQUEST_WRITE_BEHIND']
+    if request.method == "POST" and not write_behind:
+        begin_immediate()
+    goals = goal_catalog.all()
+    first_goal = goals[0].name
+    form = RequestForm()
+    if request.method == "POST":
+        if form.validate_on_submit():
+            goal = request.form.get("goal")
+            time = request.form.get("time")
+            name = form.name.data
+            phone = form.phone.data
+            goal = goal_catalog.get(goal)
+            req = Request(name=name, phone=phone, time=time, goal_id=goal.id if goal else None)
+            if write_behind:
+                request_queue.put({'name': name, 'phone': phone, 'time': time, 'goal_id': req.goal_id})
+            else:
+                db.session.add(req)
+                db.session.commit()
+            return render_template('request_done.html',
+                                   req=req,
+                                   goal=goal)
+    return render_template('request.html',
+                           goals=goals,
+                           first_goal=first_goal,
+                           form=form)
+
+
+@pages.route('/booking/<int:teacher_id>/<day>/<time>/', methods=['GET', 'POST'])
+@no_store
+def route_booking(teacher_id, day, time):
+    """ prepare data and render booking route for both methods"""
+
+    if request.method == "POST":
+        begin_immediate()
+    form = BookingForm()
+    time = time + ':00'
+    teacher = db.session.query(Teacher).options(raiseload('*')).get_or_404(teacher_id)
+    if day not in days:
+        abort(404)
+    if request.method == "POST":
+        if form.validate_on_submit():
+            name = form.name.data
+            phone = form.phone.data
+            if not book_slot(teacher_id, day, time):
+                db.session.rollback()
+                return render_template('booking.html',
+                                       form=form,
+                                       teacher=teacher,
+                                       days=days,
+                                       day=day,
+                                       time=time,
+                                       slot_taken=True)
+            booking = Booking(name=name,
+                              phone=phone,
+                              weekday=day,
+                              time=time,
+                              teacher=teacher)
+            db.session.add(booking)
+            db.session.commit()
+            if current_app.config['SLOT_STREAM']:
+                # nobody can listen without streams, and publishing writes the event file
+                slot_events.publish(teacher_id, {'day': day, 'time': time, 'free': False})
+            day = days[day]
+            return render_template('booking_done.html',
+                                   day=day,
+                                   booking=booking)
+    return render_template('booking.html',
+                           form=form,
+                           teacher=teacher,
+                           days=days,
+                           day=day,
+                           time=time)
+
+
+def render_samples():
+    """ render every page template once with real rows, so first requests of a fresh worker
+        don't pay for it, needs request context """
+
+    teacher = db.session.query(Teacher).options(joinedload(Teacher.goals)).order_by(Teacher.id).first()
+    goals = goal_catalog.all()
+    if teacher is None or not goals:
+        return []
+    goal = goals[0]
+    day, time = next(iter(days)), times[0]
+    samples = {
+        'index.html': {'teachers': [teacher], 'goals': goals},
+        'all.html': {'teachers': [teacher], 'total': 1, 'selected': None, 'next_url': None, 'goals': goals,
+                     'price_buckets': PRICE_BUCKETS, 'min_ratings': MIN_RATINGS, 'goal_counts': {},
+                     'price_counts': {}, 'args': {}},
+        'goal.html': {'goal': goal.value, 'teachers': [teacher], 'next_url': None},
+        'profile.html': {'teacher': teacher, 'free': from_mask(teacher.free_mask), 'days': days},
+        'free.html': {'results': [(teacher, [time])], 'days': days, 'times': times, 'goals': goals,
+                      'args': {'day': day}},
+        'search.html': {'query': teacher.name, 'results': [teacher], 'goals': goals,
+                        'selected_goal': None, 'selected': None},
+        'request.html': {'goals': goals, 'first_goal': goal.name, 'form': RequestForm()},
+        'request_done.html': {'req': Request(name='', phone='', time='1-2'), 'goal': goal},
+        'booking.html': {'form': BookingForm(), 'teacher': teacher, 'days': days, 'day': day, 'time': time},
+        'booking_done.html': {'day': days[day], 'booking': Booking(name='', phone='', weekday=day, time=time)},
+    }
+    for name, context in samples.items():
+        render_template(name, **context)
+    return list(samples)
@@ -0,0 +1,197 @@
+from datetime import datetime
+
+from sqlalchemy.orm import contains_eager, raiseload
+
+from facets import PRICE_BUCKET_KEYS
+from models import db, teachers_goals_association, Availability, Goal, Teacher
+from schedule import FULL_MASK, rank_by_overlap, slot_bit, times
+
+
+SORT_MODES = {'2': (Teacher.rating, True, float),
+              '3': (Teacher.price, True, int),
+              '4': (Teacher.price, False, int)}
+
+
+def free_masks(teacher_ids=None):
+    """ {teacher_id: free_mask} computed from availability table """
+
+    slots = db.session.query(Availability.teacher_id, Availability.weekday, Availability.time) \
+        .filter(db.not_(Availability.booked))
+    if teacher_ids is not None:
+        slots = slots.filter(Availability.teacher_id.in_(teacher_ids))
+    masks = {}
+    for teacher_id, day, time in slots:
+        masks[teacher_id] = masks.get(teacher_id, 0) | slot_bit(day, time)
+    return masks
+
+
+def rebuild_free_masks(teacher_ids=None):
+    """ recompute teachers.free_mask from availability, doesn't commit """
+
+    teachers = db.session.query(Teacher.id)
+    if teacher_ids is not None:
+        teachers = teachers.filter(Teacher.id.in_(teacher_ids))
+    masks = free_masks(teacher_ids)
+    rows = [{"id": teacher_id, "free_mask": masks.get(teacher_id, 0)} for teacher_id, in teachers]
+    if rows:
+        # plain statement, so updated_at and version of teachers stay as they are
+        db.session.execute(db.text("UPDATE teachers SET free_mask = :free_mask WHERE id = :id"), rows)
+    return len(rows)
+
+
+def book_slot(teacher_id, day, time):
+    """ mark slot as booked with single conditional UPDATE and clear its bit in teachers.free_mask,
+        returns False if slot doesn't exist or is already booked """
+
+    updated = db.session.query(Availability) \
+        .filter(Availability.teacher_id == teacher_id,
+                Availability.weekday == day,
+                Availability.time == time,
+                Availability.booked.is_(False)) \
+        .update({Availability.booked: True, Availability.updated_at: datetime.utcnow()},
+                synchronize_session=False)
+    if updated != 1:
+        return False
+    # updated_at is kept, cards and lists don't show schedule
+    db.session.query(Teacher).filter(Teacher.id == teacher_id) \
+        .update({Teacher.free_mask: Teacher.free_mask.op('&')(~slot_bit(day, time)),
+                 Teacher.updated_at: Teacher.updated_at},
+                synchronize_session=False)
+    if not db.session.query(Teacher.free_mask).filter(Teacher.id == teacher_id).scalar():
+        # the last free slot is gone, teacher leaves "has free slots" facet once this commits
+        db.session.info["facets_changed"] = True
+    return True
+
+
+def keyset_filter(teachers, key, descending, cursor):
+    """ keep only teachers going after (key, id) cursor, row value comparison lets sqlite seek the index """
+
+    position = db.tuple_(key, Teacher.id)
+    return teachers.filter(position < cursor if descending else position > cursor)
+
+
+def ordered_teachers(key, descending):
+    """ teachers with their sort key, id breaks ties in the same direction so one index serves the order """
+
+    teachers = db.session.query(Teacher, key.label('sort_key')).options(raiseload('*'))
+    if descending:
+        return teachers.order_by(key.desc(), Teacher.id.desc())
+    return teachers.order_by(key, Teacher.id)
+
+
+def filter_teachers(teachers, goal_id=None, price=None, min_rating=None, free=False):
+    """ narrow teachers query to facets of '/all/': goal, price bucket key, minimum rating, has free slots """
+
+    if goal_id is not None:
+        teachers = teachers \
+            .join(teachers_goals_association, teachers_goals_association.c.teacher_id == Teacher.id) \
+            .filter(teachers_goals_association.c.goal_id == goal_id)
+    bucket = PRICE_BUCKET_KEYS.get(price)
+    if bucket is not None and bucket.low is not None:
+        teachers = teachers.filter(Teacher.price >= bucket.low)
+    if bucket is not None and bucket.high is not None:
+        teachers = teachers.filter(Teacher.price <= bucket.high)
+    if min_rating is not None:
+        teachers = teachers.filter(Teacher.rating >= min_rating)
+    if free:
+        teachers = teachers.filter(Teacher.free_mask != 0)
+    return teachers
+
+
+def shuffled_teachers(start, cursor, limit, filters=None):
+    """ page of teachers in random_key order beginning from start and wrapping around,
+        every part is an index range scan so cost doesn't depend on table size,
+        filters are keyword arguments of filter_teachers """
+
+    key = Teacher.random_key
+    teachers = filter_teachers(ordered_teachers(key, False), **(filters or {}))
+    if cursor is not None and cursor[0] < start:
+        return keyset_filter(teachers.filter(key < start), key, False, cursor).limit(limit).all()
+    head = teachers.filter(key >= start)
+    if cursor is not None:
+        head = keyset_filter(head, key, False, cursor)
+    rows = head.limit(limit).all()
+    if len(rows) < limit:
+        rows += teachers.filter(key < start).limit(limit - len(rows)).all()
+    return rows
+
+
+def sorted_teachers(selected_value, cursor, limit, filters=None):
+    """ page of teachers in one of SORT_MODES order, filters are keyword arguments of filter_teachers """
+
+    key, descending, _ = SORT_MODES[selected_value]
+    teachers = filter_teachers(ordered_teachers(key, descending), **(filters or {}))
+    if cursor is not None:
+        teachers = keyset_filter(teachers, key, descending, cursor)
+    return teachers.limit(limit).all()
+
+
+def goal_teachers(goal_id):
+    """ teachers of goal by rating, walked through (goal_id, teacher_id) index """
+
+    return db.session.query(Teacher).options(raiseload('*')) \
+        .join(teachers_goals_association, teachers_goals_association.c.teacher_id == Teacher.id) \
+        .filter(teachers_goals_association.c.goal_id == goal_id) \
+        .order_by(Teacher.rating.desc())
+
+
+def profile_teacher(teacher_id):
+    """ teacher with its goals in one query, flat outer joins let sqlite walk the teachers_goals
+        primary key, joinedload nests the join and sqlite materializes the whole teachers_goals """
+
+    return db.session.query(Teacher) \
+        .outerjoin(teachers_goals_association, teachers_goals_association.c.teacher_id == Teacher.id) \
+        .outerjoin(Goal, Goal.id == teachers_goals_association.c.goal_id) \
+        .options(contains_eager(Teacher.goals), raiseload('*')) \
+        .filter(Teacher.id == teacher_id)
+
+
+def slot_times_between(hour_from, hour_to):
+    """ schedule times from hour_from to hour_to inclusive, open ends when None """
+
+    hours = [(int(time.split(':')[0]), time) for time in times]
+    return [time for hour, time in hours
+            if (hour_from is None or hour >= hour_from) and (hour_to is None or hour <= hour_to)]
+
+
+def free_teachers(day, slot_times, goal_id=None, min_price=None, max_price=None, limit=50):
+    """ (teacher, free times) of teachers free on day at some of slot_times,
+        free slots are found by ix_availability_free_slots """
+
+    free_times = db.func.group_concat(Availability.time)
+    teachers = db.session.query(Teacher, free_times.label('free_times')).options(raiseload('*')) \
+        .join(Availability, Availability.teacher_id == Teacher.id) \
+        .filter(db.not_(Availability.booked), Availability.weekday == day, Availability.time.in_(slot_times))
+    if goal_id is not None:
+        teachers = teachers \
+            .join(teachers_goals_association, teachers_goals_association.c.teacher_id == Teacher.id) \
+            .filter(teachers_goals_association.c.goal_id == goal_id)
+    if min_price is not None:
+        teachers = teachers.filter(Teacher.price >= min_price)
+    if max_price is not None:
+        teachers = teachers.filter(Teacher.price <= max_price)
+    rows = teachers.group_by(Teacher.id).order_by(Teacher.rating.desc(), Teacher.id).limit(limit).all()
+    return [(teacher, sorted(free.split(','), key=times.index)) for teacher, free in rows]
+
+
+def request_min_slots(hours):
+    """ lower bound of weekly hours of request form, '3-5' -> 3 """
+
+    try:
+        return int(hours.split('-')[0])
+    except (AttributeError, ValueError):
+        return 0
+
+
+def match_teachers(lesson_request, preferred=FULL_MASK, limit=10):
+    """ teachers of request goal ranked by number of free slots within preferred mask,
+        masks of the whole goal are scored at once in schedule.rank_by_overlap """
+
+    rows = goal_teachers(lesson_request.goal_id).with_entities(Teacher.id, Teacher.free_mask, Teacher.rating).all()
+    if not rows:
+        return []
+    teacher_ids, masks, ratings = zip(*rows)
+    ranked = rank_by_overlap(teacher_ids, masks, ratings, preferred, request_min_slots(lesson_request.time), limit)
+    teachers = {teacher.id: teacher for teacher in
+                db.session.query(Teacher).options(raiseload('*')).filter(Teacher.id.in_(ranked))}
+    return [teachers[teacher_id] for teacher_id in ranked]
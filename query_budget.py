@@ -0,0 +1,40 @@
+from sqlalchemy import event
+
+
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK")
+
+
+class QueryCounter:
+    """ counts sql statements sent through engine inside with block, transaction control isn't counted """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def count(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self.count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self.count)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+def check_budgets(client, engine, budgets):
+    """ request every url of {url: max statements} twice, so warm-up loads don't count,
+        and return {url: statements} for urls going over budget """
+
+    over_budget = {}
+    for url, budget in budgets.items():
+        client.get(url)
+        with QueryCounter(engine) as counter:
+            client.get(url)
+        if len(counter) > budget:
+            over_budget[url] = counter.statements
+    return over_budget
@@ -0,0 +1,14 @@
+def explain(session, query):
+    """ EXPLAIN QUERY PLAN details of orm query or core statement """
+
+    statement = getattr(query, 'statement', query)
+    sql = statement.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in session.execute('EXPLAIN QUERY PLAN {}'.format(sql))]
+
+
+def unindexed_steps(plan, allow_sort=False):
+    """ plan steps reading a whole table or, unless allow_sort, sorting in a temp b-tree """
+
+    return [step for step in plan
+            if (step.startswith('SCAN') and 'INDEX' not in step and 'CONSTANT ROW' not in step)
+            or ('TEMP B-TREE' in step and not allow_sort)]
@@ -0,0 +1,89 @@
+from functools import lru_cache
+
+
+days = {"mon": 'Понедельник', "tue": 'Вторник', "wed": 'Среда', "thu": 'Четверг',
+        "fri": 'Пятница', "sat": 'Суббота', "sun": 'Воскресенье'}
+
+times = ["8:00", "10:00", "12:00", "14:00", "16:00", "18:00", "20:00", "22:00"]
+
+# weekly schedule as 56-bit integer: bit day_index * 8 + time_index is set when slot is free
+SLOTS = [(day, time) for day in days for time in times]
+SLOT_BITS = {slot: 1 << index for index, slot in enumerate(SLOTS)}
+FULL_MASK = (1 << len(SLOTS)) - 1
+
+
+def slot_bit(day, time):
+    return SLOT_BITS[(day, time)]
+
+
+def to_mask(free):
+    """ mask from {day: {time: is_free}} schedule """
+
+    mask = 0
+    for day, slots in free.items():
+        for time, is_free in slots.items():
+            if is_free:
+                mask |= SLOT_BITS[(day, time)]
+    return mask
+
+
+def from_mask(mask):
+    """ {day: {time: is_free}} schedule in days and times order """
+
+    return {day: {time: bool(mask & SLOT_BITS[(day, time)]) for time in times} for day in days}
+
+
+def free_slots(mask):
+    """ list of free (day, time) """
+
+    return [slot for slot in SLOTS if mask & SLOT_BITS[slot]]
+
+
+def free_count(mask):
+    return bin(mask).count("1")
+
+
+def overlap(mask, preferred):
+    """ number of free slots that are also in preferred mask """
+
+    return free_count(mask & preferred)
+
+
+@lru_cache(maxsize=None)
+def vectorized():
+    """ (numpy, popcount table of bytes) or None without numpy, imported on first use
+        because numpy import alone takes longer than the rest of app startup """
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy, numpy.array([bin(byte).count("1") for byte in range(256)], dtype=numpy.uint8)
+
+
+def overlap_counts(masks, preferred=FULL_MASK):
+    """ overlap() of every mask with preferred at once, vectorized with numpy when it's installed """
+
+    if vectorized() is None:
+        return [overlap(mask, preferred) for mask in masks]
+    numpy, byte_popcount = vectorized()
+    masks = numpy.asarray(masks, dtype=numpy.uint64) & numpy.uint64(preferred)
+    return byte_popcount[masks.view(numpy.uint8)].reshape(-1, 8).sum(axis=1, dtype=numpy.int64)
+
+
+def rank_by_overlap(teacher_ids, masks, ratings, preferred=FULL_MASK, min_slots=0, limit=10):
+    """ ids of teachers with at least min_slots free preferred slots, most overlap first,
+        then higher rating, then lower id, the same order with and without numpy """
+
+    counts = overlap_counts(masks, preferred)
+    if vectorized() is None:
+        ranked = sorted((-count, -rating, teacher_id)
+                        for teacher_id, count, rating in zip(teacher_ids, counts, ratings) if count >= min_slots)
+        return [teacher_id for _, _, teacher_id in ranked[:limit]]
+    numpy = vectorized()[0]
+    teacher_ids = numpy.asarray(teacher_ids)
+    ratings = numpy.asarray(ratings, dtype=float)
+    fits = counts >= min_slots
+    # lexsort sorts by the last key first, teacher id breaks the remaining ties
+    order = numpy.lexsort((teacher_ids[fits], -ratings[fits], -counts[fits]))
+    return teacher_ids[fits][order][:limit].tolist()
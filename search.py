@@ -0,0 +1,60 @@
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# snippet() marks matches with control characters, html is escaped first and marks become <mark> after
+MATCH_START, MATCH_END = "\x02", "\x03"
+
+ORDERS = {
+    None: "rank, teachers.id",
+    "2": "teachers.rating DESC, teachers.id DESC",
+    "3": "teachers.price DESC, teachers.id DESC",
+    "4": "teachers.price, teachers.id",
+}
+
+SEARCH_QUERY = """
+    SELECT teachers.id, teachers.name, teachers.picture, teachers.rating, teachers.price,
+           bm25(teachers_fts, 10.0, 1.0) AS rank,
+           snippet(teachers_fts, 1, :start, :end, '…', 16) AS snippet
+    FROM teachers_fts JOIN teachers ON teachers.id = teachers_fts.rowid
+    WHERE teachers_fts MATCH :match {goal_filter}
+    ORDER BY {order}
+    LIMIT :limit
+"""
+
+GOAL_FILTER = """
+    AND EXISTS (SELECT 1 FROM teachers_goals
+                WHERE teachers_goals.teacher_id = teachers.id AND teachers_goals.goal_id = :goal_id)
+"""
+
+
+def match_expression(query):
+    """ fts5 MATCH expression from user input: every word is quoted so input can't use fts syntax,
+        the last one is a prefix for search-as-you-type, None if there are no words """
+
+    words = WORD.findall(query or "")
+    if not words:
+        return None
+    return " ".join('"{}"'.format(word) for word in words) + "*"
+
+
+def highlight(snippet):
+    return Markup(str(escape(snippet)).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>"))
+
+
+def search_teachers(session, query, goal_id=None, selected=None, limit=50):
+    """ teachers matching query in name or about, best bm25 rank first unless selected
+        is one of '/all/' sort options, with highlighted snippet of about """
+
+    match = match_expression(query)
+    if match is None:
+        return []
+    sql = SEARCH_QUERY.format(goal_filter=GOAL_FILTER if goal_id is not None else "",
+                              order=ORDERS.get(selected, ORDERS[None]))
+    rows = session.execute(text(sql), {"match": match, "goal_id": goal_id, "limit": limit,
+                                       "start": MATCH_START, "end": MATCH_END})
+    return [dict(row, snippet=highlight(row.snippet)) for row in rows]
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """ events of one teacher for one listener, get() waits up to timeout and returns None on timeout """
+
+    def __init__(self, bus, teacher_id):
+        self.bus = bus
+        self.teacher_id = teacher_id
+        self.events = queue.Queue(maxsize=100)
+
+    def get(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class SlotEventBus:
+    """ in-process pub/sub of slot changes bridged across worker processes through a small sqlite file:
+        publish() hands an event to subscribers of this process at once and appends it to the file,
+        a poller thread of every process that has subscribers reads rows of other processes
+        every poll_interval seconds, the file keeps only the last keep events """
+
+    def __init__(self, path, poll_interval=0.5, keep=10000):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.subscribers = {}
+        self.pid = None
+        self.source = None
+        self.connection = None
+        self.thread = None
+        self.last_id = None
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS events "
+                           "(id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT NOT NULL, "
+                           "teacher_id INTEGER NOT NULL, payload TEXT NOT NULL)")
+        return connection
+
+    def start(self):
+        """ open event file and start poller in current process, called again after fork """
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.source = uuid.uuid4().hex
+            self.subscribers = {}
+            self.last_id = None
+            self.connection = self.connect()
+            self.thread = threading.Thread(target=self.run, name="slot-events-poller", daemon=True)
+            self.thread.start()
+
+    def publish(self, teacher_id, event):
+        """ event is json serializable dict, call it after the change is committed """
+
+        self.start()
+        self.deliver(teacher_id, event)
+        payload = json.dumps(event)
+        with self.lock:
+            cursor = self.connection.execute("INSERT INTO events (source, teacher_id, payload) VALUES (?, ?, ?)",
+                                             (self.source, teacher_id, payload))
+            if cursor.lastrowid % 1000 == 0:
+                self.connection.execute("DELETE FROM events WHERE id <= ?", (cursor.lastrowid - self.keep,))
+
+    def subscribe(self, teacher_id):
+        self.start()
+        subscription = Subscription(self, teacher_id)
+        with self.lock:
+            if self.last_id is None:
+                # the first listener, poller starts from here, before the caller reads current state
+                self.last_id = self.connection.execute("SELECT coalesce(max(id), 0) FROM events").fetchone()[0]
+            self.subscribers.setdefault(teacher_id, set()).add(subscription)
+        self.wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.teacher_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscribers.pop(subscription.teacher_id, None)
+
+    def deliver(self, teacher_id, event):
+        """ hand event to local subscribers of teacher, a listener too slow to take it loses it
+            and catches up from the schedule it gets on reconnect """
+
+        with self.lock:
+            subscriptions = list(self.subscribers.get(teacher_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.events.put_nowait(event)
+            except queue.Full:
+                logger.warning("slot events of teacher %s dropped for slow listener", teacher_id)
+
+    def run(self):
+        connection = self.connect()
+        while True:
+            with self.lock:
+                idle = not self.subscribers
+                if idle:
+                    # nobody listens, events published meanwhile are skipped
+                    self.last_id = None
+            if idle:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            try:
+                rows = connection.execute("SELECT id, source, teacher_id, payload FROM events WHERE id > ? "
+                                          "ORDER BY id", (self.last_id,)).fetchall()
+            except sqlite3.Error:
+                logger.exception("reading slot events failed")
+                rows = []
+            for event_id, source, teacher_id, payload in rows:
+                self.last_id = event_id
+                if source != self.source and teacher_id in self.subscribers:
+                    self.deliver(teacher_id, json.loads(payload))
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
@@ -0,0 +1,72 @@
+import sqlite3
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+# applied to every new connection, WAL lets readers go on while a writer commits,
+# busy_timeout makes writers wait for the lock instead of failing with "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -32768,
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def engine_options(worker_class="sync", threads=1, write_behind=False):
+    """ SQLALCHEMY_ENGINE_OPTIONS for gunicorn worker class, a worker never needs
+        more connections than requests it serves at once, plus one for the write-behind flusher """
+
+    if worker_class == "gthread":
+        pool_size = threads
+    elif worker_class == "gevent":
+        pool_size = 10
+    else:
+        pool_size = 1
+    return {"poolclass": QueuePool,
+            "pool_size": pool_size + 1 if write_behind else pool_size,
+            "max_overflow": 0,
+            "pool_timeout": 30,
+            "connect_args": {"check_same_thread": False}}
+
+
+def begin_immediate():
+    """ next transaction in this request takes the write lock at once, so it waits
+        for other writers with busy_timeout instead of failing when upgrading a read lock """
+
+    g.sqlite_begin_immediate = True
+
+
+def configure_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    dbapi_connection.isolation_level = None
+    pragmas = current_app.config.get("SQLITE_PRAGMAS", {}) if has_app_context() else SQLITE_PRAGMAS
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute("PRAGMA {} = {}".format(name, value))
+    cursor.close()
+
+
+def begin_transaction(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    immediate = has_app_context() and g.pop("sqlite_begin_immediate", False) \
+        and current_app.config.get("SQLITE_BEGIN_IMMEDIATE")
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+
+def init_sqlite(app):
+    """ apply SQLITE_PRAGMAS of current app on connect and emit BEGIN ourselves, pysqlite's implicit BEGIN
+        is always deferred, listeners are shared by all apps so they are added once """
+
+    app.config.setdefault("SQLITE_PRAGMAS", SQLITE_PRAGMAS)
+    app.config.setdefault("SQLITE_BEGIN_IMMEDIATE", True)
+    if not event.contains(Engine, "connect", configure_connection):
+        event.listen(Engine, "connect", configure_connection)
+        event.listen(Engine, "begin", begin_transaction)
@@ -0,0 +1,36 @@
+// keeps free slot buttons of profile page current, the server pushes slot changes over server-sent events
+(function () {
+  var section = document.querySelector("[data-slots-stream]");
+  if (!section || !window.EventSource) {
+    return;
+  }
+
+  function showSlot(day, time, free) {
+    var slots = section.querySelector('.slots[data-day="' + day + '"]');
+    if (!slots) {
+      return;
+    }
+    var link = slots.querySelector('a[data-time="' + time + '"]');
+    if (link) {
+      link.classList.toggle("d-none", !free);
+    }
+    var empty = slots.querySelector(".no-slots");
+    if (empty) {
+      empty.classList.toggle("d-none", !!slots.querySelector("a:not(.d-none)"));
+    }
+  }
+
+  var source = new EventSource(section.getAttribute("data-slots-stream"));
+  source.addEventListener("schedule", function (event) {
+    var schedule = JSON.parse(event.data);
+    Object.keys(schedule).forEach(function (day) {
+      Object.keys(schedule[day]).forEach(function (time) {
+        showSlot(day, time, schedule[day][time]);
+      });
+    });
+  });
+  source.addEventListener("slot", function (event) {
+    var slot = JSON.parse(event.data);
+    showSlot(slot.day, slot.time, slot.free);
+  });
+})();
@@ -0,0 +1,100 @@
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from flask_migrate import upgrade
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from models import db, Availability, Teacher
+from generate_data import fill_database
+from benchmark import scratch_files
+
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def make_app(database, plain):
+    config = dict(scratch_files(os.path.dirname(database)),
+                  SQLALCHEMY_DATABASE_URI="sqlite:///" + database,
+                  WTF_CSRF_ENABLED=False,
+                  PROPAGATE_EXCEPTIONS=True)
+    if plain:
+        config.update({"SQLITE_PRAGMAS": {}, "SQLITE_BEGIN_IMMEDIATE": False})
+    return create_app(config)
+
+
+def worker(database, plain, seconds, write_share, seed, results):
+    """ mixed reads and writes through test client until time is over """
+
+    app = make_app(database, plain)
+    rng = random.Random(seed)
+    with app.app_context():
+        teacher_ids = [teacher_id for teacher_id, in db.session.query(Teacher.id)]
+        slots = db.session.query(Availability.teacher_id, Availability.weekday, Availability.time).all()
+        db.session.remove()
+    client = app.test_client()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        write = rng.random() < write_share
+        try:
+            if write and rng.random() < 0.5:
+                teacher_id, day, slot_time = rng.choice(slots)
+                client.post("/booking/{}/{}/{}/".format(teacher_id, day, slot_time.replace(":00", "")),
+                            data={"name": "Stress", "phone": "1234567"})
+            elif write:
+                client.post("/request/", data={"name": "Stress", "phone": "1234567", "goal": "work", "time": "1-2"})
+            elif rng.random() < 0.5:
+                client.get("/profiles/{}/".format(rng.choice(teacher_ids)))
+            else:
+                client.get("/all/?selected=2")
+            counts["writes" if write else "reads"] += 1
+        except OperationalError as error:
+            counts["locked" if "locked" in str(error) else "other errors"] += 1
+    results.put(dict(counts))
+
+
+def run(processes, seconds, write_share, plain, teachers):
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "stress.db")
+        app = make_app(database, plain)
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            fill_database(teachers, seed=0)
+            db.session.remove()
+            db.engine.dispose()
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=worker, args=(database, plain, seconds, write_share, seed, results))
+                   for seed in range(processes)]
+        for process in workers:
+            process.start()
+        total = Counter()
+        for _ in workers:
+            total.update(results.get())
+        for process in workers:
+            process.join()
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="concurrent reads and writes from several processes, "
+                                                 "fails if any request hits 'database is locked'")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-share", type=float, default=0.3)
+    parser.add_argument("--teachers", type=int, default=1000)
+    parser.add_argument("--plain", action="store_true",
+                        help="run without SQLITE_PRAGMAS and BEGIN IMMEDIATE to compare")
+    args = parser.parse_args()
+
+    total = run(args.processes, args.seconds, args.write_share, args.plain, args.teachers)
+    print("reads {reads}, writes {writes}, locked {locked}, other errors {other}".format(
+        reads=total["reads"], writes=total["writes"], locked=total["locked"], other=total["other errors"]))
+    if total["locked"] or total["other errors"]:
+        raise SystemExit(1)
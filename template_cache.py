@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class AtomicBytecodeCache(FileSystemBytecodeCache):
+    """ jinja bytecode cache in a directory shared by workers, a file is written aside and renamed,
+        so another worker never loads half written bytecode, stale files are rejected by source checksum """
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as cache_file:
+                bucket.write_bytecode(cache_file)
+            os.replace(temporary, filename)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+def init_template_cache(app):
+    """ keep compiled templates in TEMPLATE_CACHE_DIR between worker starts, must run
+        before anything touches app.jinja_env """
+
+    directory = app.config.get("TEMPLATE_CACHE_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=AtomicBytecodeCache(directory))
+
+
+def compile_templates(app):
+    """ load every template so it is compiled or read from the bytecode cache, returns their names """
+
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
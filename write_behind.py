@@ -0,0 +1,156 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+# a claim older than this is taken as left by a dead flusher and its records are claimed again
+CLAIM_TIMEOUT = 300
+
+DELETE_CLAIMED = "DELETE FROM pending WHERE claimed_by = ?"
+RELEASE_CLAIMED = "UPDATE pending SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?"
+
+
+class WriteBehindQueue:
+    """ durable local queue: put() appends a record to a small sqlite file and returns,
+        a background thread hands records to write_batch(records) in batches of batch_size
+        at least every max_latency seconds, records stay queued until write_batch succeeds.
+        A batch is claimed and deleted in two short queue transactions, write_batch runs between
+        them without the queue lock, so put() of other workers never waits for the main database """
+
+    def __init__(self, path, write_batch, batch_size=100, max_latency=1.0):
+        self.path = path
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+        self.token = None
+        self.written = False
+        self.connection = None
+        self.thread = None
+        self.stopping = False
+        self.queued = 0
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("CREATE TABLE IF NOT EXISTS pending "
+                           "(id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)")
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(pending)")}
+        if "claimed_by" not in columns:
+            # queue files written before batches were claimed
+            connection.execute("ALTER TABLE pending ADD COLUMN claimed_by TEXT")
+            connection.execute("ALTER TABLE pending ADD COLUMN claimed_at REAL")
+        connection.execute("COMMIT")
+        return connection
+
+    def start(self):
+        """ open queue and start flusher in current process, called again after fork """
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.token = uuid.uuid4().hex
+            self.written = False
+            self.connection = self.connect()
+            self.stopping = False
+            self.thread = threading.Thread(target=self.run, name="write-behind-flusher", daemon=True)
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def put(self, record):
+        self.start()
+        with self.lock:
+            self.connection.execute("INSERT INTO pending (payload) VALUES (?)", (json.dumps(record),))
+            self.queued += 1
+            if self.queued >= self.batch_size:
+                self.wakeup.set()
+
+    def run(self):
+        connection = self.connect()
+        while not self.stopping:
+            self.wakeup.wait(self.max_latency)
+            self.wakeup.clear()
+            self.flush(connection)
+        self.flush(connection)
+        connection.close()
+
+    def flush(self, connection):
+        """ move all pending records in batches: claim a batch and commit, write it, delete it,
+            a batch that failed to write is released and stays queued, a written batch that failed
+            to be deleted is deleted before anything else is claimed, so it is never written twice """
+
+        while True:
+            with self.lock:
+                self.queued = 0
+            if self.written and not self.settle(connection, DELETE_CLAIMED):
+                return
+            try:
+                rows = self.claim(connection)
+            except sqlite3.Error:
+                logger.exception("claiming write-behind batch failed, records stay queued")
+                return
+            if not rows:
+                return
+            try:
+                self.write_batch([json.loads(payload) for _, payload in rows])
+            except Exception:
+                logger.exception("write-behind batch failed, records stay queued")
+                self.settle(connection, RELEASE_CLAIMED)
+                return
+            self.written = True
+            if not self.settle(connection, DELETE_CLAIMED):
+                return
+            if len(rows) < self.batch_size:
+                return
+
+    def claim(self, connection):
+        """ mark up to batch_size oldest unclaimed records with token of this flusher, returns them """
+
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("UPDATE pending SET claimed_by = ?, claimed_at = ? WHERE id IN "
+                               "(SELECT id FROM pending WHERE claimed_by IS NULL OR claimed_at < ? "
+                               "ORDER BY id LIMIT ?)",
+                               (self.token, now, now - CLAIM_TIMEOUT, self.batch_size))
+            rows = connection.execute("SELECT id, payload FROM pending WHERE claimed_by = ? ORDER BY id",
+                                      (self.token,)).fetchall()
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            # BEGIN IMMEDIATE itself may fail on a busy queue, then there is nothing to roll back
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        return rows
+
+    def settle(self, connection, statement):
+        """ delete or release records claimed by this flusher, False when the queue stayed busy """
+
+        try:
+            connection.execute(statement, (self.token,))
+        except sqlite3.Error:
+            logger.exception("settling write-behind batch failed")
+            return False
+        self.written = False
+        return True
+
+    def stop(self):
+        """ write out everything queued and stop flusher, safe to call more than once """
+
+        if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+            return
+        self.stopping = True
+        self.wakeup.set()
+        self.thread.join()
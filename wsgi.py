@@ -0,0 +1,6 @@
+from app import create_app, warm_up
+
+
+# web workers don't run migrations, so alembic isn't imported, templates are never checked for changes
+app = create_app({"MIGRATIONS": False, "TEMPLATES_AUTO_RELOAD": False})
+warm_up(app)